@@ -0,0 +1,120 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import asyncio, logging
+import aiohttp
+from .pronto import ProntoEndpoints, BackendError, DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE, auth_headers, build_request, build_handler, parse_retry_after
+from .middleware import RequestMetrics, RetryPolicy, RateLimiter, SingleFlight, ResponseCache
+
+# Upper bound on requests in flight at once, across every endpoint
+DEFAULT_MAX_CONCURRENCY = 32
+
+class AsyncPronto(ProntoEndpoints):
+    """
+    Awaitable mirror of Pronto for code that already runs on an asyncio loop.
+    All calls share one aiohttp connection pool, and a semaphore caps how many
+    are in flight, so callers can gather() hundreds of requests safely.
+    The session is bound to the loop it is first used on.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, max_concurrency=DEFAULT_MAX_CONCURRENCY, middleware=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        self.cache = ResponseCache()
+        self.single_flight = SingleFlight()
+        self.metrics = RequestMetrics()
+        self.retry = RetryPolicy()
+        self.rate_limiter = RateLimiter()
+        self.middleware = [self.cache, self.single_flight, self.metrics, self.retry, self.rate_limiter] if middleware is None else list(middleware)
+        self._handler = build_handler(self._send, self.middleware, attr="acall")
+
+    @classmethod
+    def sharing(cls, pronto, **kwargs):
+        """
+        An async client that runs through pronto's middleware, so its calls hit the
+        same cache, rate budget and retry policy and show up in pronto.stats().
+        """
+        client = cls(timeout=pronto.timeout, middleware=pronto.middleware, **kwargs)
+        client.cache, client.single_flight, client.metrics = pronto.cache, pronto.single_flight, pronto.metrics
+        client.retry, client.rate_limiter = pronto.retry, pronto.rate_limiter
+        return client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = self.timeout
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.pool_size)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def add_middleware(self, layer):
+        """Append a middleware layer; it runs inside the ones already installed."""
+        self.middleware.append(layer)
+        self._handler = build_handler(self._send, self.middleware, attr="acall")
+
+    def stats(self):
+        """Counters for tuning: per-endpoint latency, throttling and retries."""
+        return {
+            "endpoints": self.metrics.snapshot(),
+            "rate_limiter": self.rate_limiter.snapshot(),
+            "retry": self.retry.snapshot(),
+            "single_flight": self.single_flight.snapshot(),
+            "cache": self.cache.snapshot(),
+        }
+
+    # REQUEST PIPELINE
+    # Same endpoint registry and middleware as Pronto, awaited instead of blocking
+    async def _call(self, name, access_token=None, **params):
+        return await self._handler(build_request(name, access_token, **params))
+
+    async def _send(self, request):
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.post(request.url, headers=auth_headers(request.access_token), json=request.payload) as response:
+                    if response.status >= 400:
+                        self.logger.error("HTTP error occurred on %s: %s %s", request.endpoint.name, response.status, response.reason)
+                        if self.logger.isEnabledFor(logging.DEBUG):
+                            self.logger.debug("Response body: %.500s", await response.text())
+                        raise BackendError(f"HTTP error occurred: {response.status} {response.reason} for url: {request.url}",
+                                           response.status, parse_retry_after(response.headers.get("Retry-After")))
+                    return await response.json(content_type=None)
+            except BackendError:
+                raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as req_err:
+                self.logger.error("Request exception occurred on %s: %r", request.endpoint.name, req_err)
+                raise BackendError(f"Request exception occurred: {req_err!r}", transient=True)
+            except aiohttp.ClientError as req_err:
+                self.logger.error("Request exception occurred on %s: %r", request.endpoint.name, req_err)
+                raise BackendError(f"Request exception occurred: {req_err!r}")
+            except Exception as err:
+                self.logger.error("An unexpected error occurred on %s: %s", request.endpoint.name, err)
+                raise BackendError(f"An unexpected error occurred: {err}")
+
+    # Endpoint methods come from ProntoEndpoints; only helpers that need a loop live here
+    async def get_many_bubble_messages(self, access_token, bubbleIDs):
+        """Fetch the latest history of several bubbles concurrently, keyed by bubble ID."""
+        results = await asyncio.gather(
+            *(self.get_bubble_messages(access_token, bubbleID) for bubbleID in bubbleIDs),
+            return_exceptions=True,
+        )
+        return dict(zip(bubbleIDs, results))
@@ -0,0 +1,67 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+def file_lock(path):
+    """The writer lock for a file path; every writer to the same file shares it."""
+    key = os.path.realpath(path)
+    with _locks_lock:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.RLock()
+        return lock
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Directories cannot be opened on Windows; the rename is still atomic
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+@contextmanager
+def atomic_open(path, mode="w"):
+    """
+    Open a temp file next to path for writing; on a clean exit it is fsynced and
+    renamed over path, so readers see the old file or the new one, never a partial
+    write. Writers to the same path are serialized. On error the temp file is
+    removed and path is left untouched. New files are created owner-only (0600).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with file_lock(path):
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, mode) as file:
+                yield file
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        _fsync_dir(directory)
+
+def atomic_write_json(path, data):
+    """Replace path with compact JSON for data, atomically."""
+    with atomic_open(path, "w") as file:
+        json.dump(data, file, separators=(",", ":"))
+
+def atomic_write_bytes(path, data):
+    with atomic_open(path, "wb") as file:
+        file.write(data)
@@ -0,0 +1,172 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import threading, time
+from .middleware import TokenBucket
+from .sync import HISTORY_PAGE_SIZE
+
+# Global budget for background history requests, on top of the per-family rate limits
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_BURST = 5
+# How long to sleep when every bubble is complete or there is no access token
+IDLE_INTERVAL = 300
+# How often the bubble list is re-read from bubbleOverview.json
+BUBBLE_REFRESH_INTERVAL = 60
+# Failed bubbles are retried after this many seconds, doubling up to MAX_FAILURE_BACKOFF
+FAILURE_BACKOFF = 30
+MAX_FAILURE_BACKOFF = 1800
+
+class BackfillScheduler:
+    """
+    Background worker that walks bubble.history backwards until every bubble's
+    local archive reaches its first message.
+
+    Progress is checkpointed in the store's sync_state table after every page,
+    so a restart resumes where it stopped. The active bubble is always served
+    first, and all requests draw from one token bucket so the archive never
+    competes with the UI for Pronto's rate limits.
+    """
+    def __init__(self, sync, get_access_token, get_bubble_ids, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST):
+        self.sync = sync
+        self.store = sync.store
+        self.get_access_token = get_access_token
+        self.get_bubble_ids = get_bubble_ids
+        self.requests_per_minute = requests_per_minute
+        self.budget = TokenBucket(requests_per_minute / 60.0, burst)
+        self.active_bubble = None
+        self.pages = 0
+        self.messages = 0
+        self.errors = 0
+        # Time spent in page fetches only, so idle waits, budget waits and failure backoff
+        # do not drag down the measured page rate
+        self.fetch_seconds = 0.0
+        self._bubble_ids = []
+        self._bubble_ids_at = 0.0
+        self._failures = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="history-backfill", daemon=True)
+            self._thread.start()
+        print("Backfill scheduler started")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def set_active(self, bubble_id):
+        """Move a bubble to the front of the queue, e.g. when it is opened in the UI."""
+        self.active_bubble = int(bubble_id) if bubble_id is not None else None
+        self._failures.pop(self.active_bubble, None)
+        self._wake.set()
+
+    def _refresh_bubble_ids(self):
+        now = time.monotonic()
+        if not self._bubble_ids or now - self._bubble_ids_at > BUBBLE_REFRESH_INTERVAL:
+            self._bubble_ids = [int(bubble_id) for bubble_id in self.get_bubble_ids() or []]
+            self._bubble_ids_at = now
+        return self._bubble_ids
+
+    def _next_bubble(self):
+        bubble_ids = self._refresh_bubble_ids()
+        states = self.store.get_sync_states()
+        now = time.monotonic()
+        candidates = ([self.active_bubble] if self.active_bubble is not None else []) + bubble_ids
+        for bubble_id in candidates:
+            failure = self._failures.get(bubble_id)
+            if failure and failure[1] > now:
+                continue
+            if not states.get(bubble_id, {}).get("complete"):
+                return bubble_id
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            access_token = self.get_access_token()
+            bubble_id = self._next_bubble() if access_token else None
+            if bubble_id is None:
+                self._wake.wait(IDLE_INTERVAL if access_token else BUBBLE_REFRESH_INTERVAL)
+                self._wake.clear()
+                continue
+
+            wait = self.budget.reserve()
+            if wait > 0 and self._stop.wait(wait):
+                break
+            try:
+                self._step(access_token, bubble_id)
+                self._failures.pop(bubble_id, None)
+            except Exception as e:
+                self.errors += 1
+                attempts = self._failures.get(bubble_id, (0, 0))[0] + 1
+                delay = min(MAX_FAILURE_BACKOFF, FAILURE_BACKOFF * 2 ** (attempts - 1))
+                self._failures[bubble_id] = (attempts, time.monotonic() + delay)
+                print(f"Backfill of bubble {bubble_id} failed ({e}); retrying in {delay}s")
+                status = getattr(e, "status_code", None)
+                if status == 429:
+                    self.budget.throttled(getattr(e, "retry_after", None))
+
+    def _step(self, access_token, bubble_id):
+        started = time.monotonic()
+        try:
+            if self.store.get_sync_state(bubble_id)["high_water"] is None:
+                result = self.sync.sync_latest(access_token, bubble_id, max_pages=1)
+                fetched = result["new"]
+            else:
+                result = self.sync.backfill(access_token, bubble_id, pages=1)
+                fetched = result["fetched"]
+        finally:
+            self.fetch_seconds += time.monotonic() - started
+        self.pages += result["pages"]
+        self.messages += fetched
+        self.budget.succeeded()
+
+    def progress(self):
+        """Per-bubble archive state plus an overall ETA estimate."""
+        bubble_ids = self._refresh_bubble_ids()
+        states = self.store.get_sync_states()
+        counts = self.store.count_by_bubble()
+
+        bubbles, complete_sizes, remaining = [], [], []
+        for bubble_id in bubble_ids:
+            state = states.get(bubble_id, {})
+            stored = counts.get(bubble_id, 0)
+            bubbles.append({
+                "bubble_id": bubble_id,
+                "stored": stored,
+                "complete": bool(state.get("complete")),
+                "oldest_id": state.get("low_water"),
+            })
+            (complete_sizes if state.get("complete") else remaining).append(stored)
+
+        # Guess each unfinished bubble is as large as the average finished one
+        eta = None
+        page_rate = self.pages / self.fetch_seconds if self.pages and self.fetch_seconds else self.requests_per_minute / 60.0
+        if not remaining:
+            eta = 0
+        elif complete_sizes:
+            average = sum(complete_sizes) / len(complete_sizes)
+            pages_left = sum(max(1, (average - stored) / HISTORY_PAGE_SIZE) for stored in remaining)
+            eta = round(pages_left / min(page_rate, self.requests_per_minute / 60.0))
+
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "active_bubble": self.active_bubble,
+            "bubbles_total": len(bubble_ids),
+            "bubbles_complete": len(complete_sizes),
+            "pages_fetched": self.pages,
+            "messages_fetched": self.messages,
+            "errors": self.errors,
+            "pages_per_minute": round(page_rate * 60, 1),
+            "eta_seconds": eta,
+            "bubbles": bubbles,
+        }
@@ -0,0 +1,217 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import json, os, threading, zlib
+
+# Settings key (settings.json) that picks the codec for stored message payloads
+SETTING_KEY = "storage_codec"
+DEFAULT_CODEC = "json"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+class JsonCodec:
+    """Compact JSON text. Readable with any SQLite browser and passed through by exports as-is."""
+    name = "json"
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(self, data):
+        return json.loads(data)
+
+class MsgpackCodec:
+    """msgpack binary (optional dependency: pip install msgpack)."""
+    name = "msgpack"
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+class ZlibCodec:
+    """Any inner codec compressed with zlib (standard library)."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = f"{inner.name}+zlib"
+
+    def dumps(self, obj):
+        data = self.inner.dumps(obj)
+        return zlib.compress(data.encode("utf-8") if isinstance(data, str) else data, ZLIB_LEVEL)
+
+    def loads(self, data):
+        return decode(zlib.decompress(data))
+
+class ZstdCodec:
+    """Any inner codec compressed with zstd (optional dependency: pip install zstandard)."""
+
+    def __init__(self, inner):
+        import zstandard
+        self._zstd = zstandard
+        self._local = threading.local()  # zstandard (de)compressors are not thread-safe
+        self.inner = inner
+        self.name = f"{inner.name}+zstd"
+
+    def _compressor(self):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = self._zstd.ZstdCompressor(level=ZSTD_LEVEL)
+            self._local.decompressor = self._zstd.ZstdDecompressor()
+        return self._local.compressor, self._local.decompressor
+
+    def dumps(self, obj):
+        data = self.inner.dumps(obj)
+        return self._compressor()[0].compress(data.encode("utf-8") if isinstance(data, str) else data)
+
+    def loads(self, data):
+        return decode(self._compressor()[1].decompress(data))
+
+BASE_CODECS = {"json": JsonCodec, "msgpack": MsgpackCodec}
+COMPRESSORS = {"zlib": ZlibCodec, "zstd": ZstdCodec}
+CODEC_NAMES = ("json", "json+zlib", "json+zstd", "msgpack", "msgpack+zlib", "msgpack+zstd")
+
+def get_codec(name=DEFAULT_CODEC):
+    """
+    Codec for a name like "json", "msgpack" or "msgpack+zstd". Raises ValueError
+    for unknown names and ImportError when an optional dependency is missing.
+    """
+    base, _, compressor = (name or DEFAULT_CODEC).strip().lower().partition("+")
+    if base not in BASE_CODECS or (compressor and compressor not in COMPRESSORS):
+        raise ValueError(f"Unknown storage codec {name!r}; expected one of {', '.join(CODEC_NAMES)}")
+    codec = BASE_CODECS[base]()
+    return COMPRESSORS[compressor](codec) if compressor else codec
+
+def codec_from_settings(settings):
+    """The configured codec, falling back to compact JSON if its dependency is missing."""
+    name = (settings or {}).get(SETTING_KEY, DEFAULT_CODEC)
+    try:
+        return get_codec(name)
+    except (ImportError, ValueError) as e:
+        print(f"Storage codec {name!r} unavailable ({e}); using {DEFAULT_CODEC}")
+        return get_codec(DEFAULT_CODEC)
+
+_decoders = {}
+
+def _decoder(name):
+    codec = _decoders.get(name)
+    if codec is None:
+        codec = _decoders[name] = get_codec(name)
+    return codec
+
+def decode(data):
+    """
+    Decode a payload written by any codec, detected from its first bytes, so a
+    database can hold rows from several codecs while it is being migrated.
+    """
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    if data[:4] == ZSTD_MAGIC:
+        return _decoder("json+zstd").loads(data)
+    if data[:1] in (b"{", b"[", b'"') or data[:1].isspace():
+        return json.loads(data)
+    if data[:1] == b"\x78":
+        return decode(zlib.decompress(data))
+    return _decoder("msgpack").loads(data)
+
+def migrate(codec_name):
+    """Switch the storage_codec setting and re-encode the local archive to match."""
+    from .systemcheck import createappfolders
+    from .readjson import ReadJSON
+    from .messagestore import MessageStore
+    paths = createappfolders()
+    chats_path, settingsJSONPath = paths[1], paths[9]
+    codec = get_codec(codec_name)
+    settings = ReadJSON.get_settings(settingsJSONPath)
+    settings[SETTING_KEY] = codec.name
+    ReadJSON.save_response_to_file(settings, settingsJSONPath)
+    return MessageStore(os.path.join(os.path.dirname(chats_path), "messages.db"), codec=codec).migrate_codec(codec)
+
+def benchmark(messages=100000, bubbles=20):
+    """
+    Compare the old pretty-printed fullmessages.json files with each available
+    codec in the SQLite archive: size on disk, write time and load time.
+    """
+    import shutil, tempfile, time
+    from .messagestore import MessageStore, detail_message
+    workdir = tempfile.mkdtemp(prefix="bpro-codec-bench-")
+    per_bubble = messages // bubbles
+    archive = {
+        bubble_id: [
+            {
+                "id": bubble_id * 1000000 + i,
+                "bubble_id": bubble_id,
+                "created_at": "2025-01-01 12:00:00",
+                "user_edited_version": 0,
+                "user_edited_at": None,
+                "parentmessage_id": None,
+                "message": f"Message {i} in bubble {bubble_id}: see you at the review session tomorrow?",
+                "user": {"id": i % 40, "fullname": f"Student {i % 40}", "profilepicurl": f"https://files.pronto.io/files/users/{i % 40}/profilepic"},
+                "reactionsummary": [{"reactiontype_id": 1, "count": i % 3}] if i % 5 == 0 else [],
+            }
+            for i in range(per_bubble)
+        ]
+        for bubble_id in range(1, bubbles + 1)
+    }
+    rows = []
+    try:
+        # Baseline: the old indent=4 fullmessages.json (raw) + messages.json (detail) per bubble
+        folder = os.path.join(workdir, "pretty")
+        os.makedirs(folder)
+        started = time.perf_counter()
+        for bubble_id, bubble_messages in archive.items():
+            with open(os.path.join(folder, f"{bubble_id}.full.json"), "w") as file:
+                json.dump({"messages": bubble_messages}, file, indent=4)
+            with open(os.path.join(folder, f"{bubble_id}.json"), "w") as file:
+                json.dump({"messages": [detail_message(m) for m in bubble_messages]}, file, indent=4)
+        written = time.perf_counter() - started
+        started = time.perf_counter()
+        for bubble_id in archive:
+            with open(os.path.join(folder, f"{bubble_id}.json")) as file:
+                json.load(file)
+        loaded = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+        rows.append(("pretty json files", size, written, loaded))
+
+        for name in CODEC_NAMES:
+            try:
+                codec = get_codec(name)
+            except ImportError:
+                print(f"{name:18} skipped (dependency not installed)")
+                continue
+            db_path = os.path.join(workdir, f"{name}.db")
+            store = MessageStore(db_path, codec=codec)
+            started = time.perf_counter()
+            for bubble_id, bubble_messages in archive.items():
+                store.upsert_messages(bubble_id, bubble_messages)
+            written = time.perf_counter() - started
+            started = time.perf_counter()
+            for bubble_id in archive:
+                store.get_messages(bubble_id)
+            loaded = time.perf_counter() - started
+            store._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            # Payload columns only, so the shared indexes and FTS table do not hide the difference
+            payload = store._conn().execute("SELECT SUM(LENGTH(detail) + COALESCE(LENGTH(raw), 0)) FROM messages").fetchone()[0]
+            rows.append((f"sqlite {name}", payload, written, loaded))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"{messages} messages in {bubbles} bubbles")
+    for label, size, written, loaded in rows:
+        print(f"{label:22} {size / 1e6:8.1f} MB payload  write {written:6.2f}s  load {loaded:6.2f}s")
+    return rows
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 3 and sys.argv[1] == "migrate":
+        migrate(sys.argv[2])
+    elif len(sys.argv) == 2 and sys.argv[1] == "benchmark":
+        benchmark()
+    else:
+        print("usage: python -m bpro.codec benchmark | migrate <codec>")
+        print(f"codecs: {', '.join(CODEC_NAMES)}")
@@ -0,0 +1,119 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+from dataclasses import dataclass, field
+
+API_BASE_URL = "https://stanfordohs.pronto.io/"
+ACCOUNTS_BASE_URL = "https://accounts.pronto.io/"
+
+@dataclass(frozen=True, eq=False)
+class Endpoint:
+    """
+    Declarative description of one Pronto API call.
+    `fields` are always sent (None included), `optional` only when not None,
+    `defaults` are static entries and `path_params` are formatted into the path.
+    `family` groups endpoints for rate limiting; `idempotent` calls are safe to retry.
+    `cache_ttl` (seconds) makes a read cacheable; `invalidates` lists the cached
+    reads a successful write makes stale.
+    """
+    name: str
+    version: str = "v1"
+    path: str = None
+    fields: tuple = ()
+    optional: tuple = ()
+    defaults: dict = field(default_factory=dict)
+    path_params: tuple = ()
+    base_url: str = API_BASE_URL
+    auth: bool = True
+    family: str = "default"
+    idempotent: bool = False
+    cache_ttl: float = None
+    invalidates: tuple = ()
+    url: str = field(init=False)
+
+    def __post_init__(self):
+        # Built once here instead of with an f-string on every call
+        path = self.path or f"api/{self.version}/{self.name}"
+        object.__setattr__(self, "url", self.base_url + path)
+        object.__setattr__(self, "_allowed", frozenset(self.fields + self.optional + self.path_params))
+
+    def build_request(self, params):
+        """Return (url, payload) for the given keyword params, validating them against the schema."""
+        unknown = params.keys() - self._allowed
+        if unknown:
+            raise TypeError(f"{self.name} got unexpected fields: {sorted(unknown)}")
+        missing = [name for name in self.fields + self.path_params if name not in params]
+        if missing:
+            raise TypeError(f"{self.name} is missing required fields: {missing}")
+
+        url = self.url
+        if self.path_params:
+            url = url.format(**{name: params[name] for name in self.path_params})
+
+        if not (self.fields or self.optional or self.defaults):
+            return url, None
+        payload = dict(self.defaults)
+        for name in self.fields:
+            payload[name] = params[name]
+        for name in self.optional:
+            value = params.get(name)
+            if value is not None:
+                payload[name] = value
+        return url, payload
+
+@dataclass
+class Request:
+    """A single outgoing call as seen by middleware."""
+    endpoint: Endpoint
+    access_token: str
+    url: str
+    payload: dict
+
+def _registry(*endpoints):
+    return {endpoint.name: endpoint for endpoint in endpoints}
+
+ENDPOINTS = _registry(
+    # AUTHENTICATION
+    Endpoint("user.verify", fields=("email",), base_url=ACCOUNTS_BASE_URL, auth=False, family="auth"),
+    Endpoint("user.login", version="v3", fields=("email", "code", "device"), base_url=ACCOUNTS_BASE_URL, auth=False, family="auth"),
+    Endpoint("user.tokenlogin", fields=("logintokens", "device"), auth=False, family="auth"),
+    Endpoint("pusher.auth", fields=("socket_id", "channel_name"), family="pusher", idempotent=True),
+
+    # BUBBLES
+    Endpoint("bubble.list", version="v3", family="bubble", idempotent=True),
+    Endpoint("bubble.history", fields=("bubble_id",), optional=("latest",), family="bubble", idempotent=True),
+    Endpoint("bubble.info", version="v2", fields=("bubble_id",), family="bubble", idempotent=True, cache_ttl=300),
+    Endpoint("bubble.mark", fields=("bubble_id", "message_id"), family="bubble"),
+    Endpoint("membership.update", fields=("bubble_id", "marked_unread"), family="bubble", invalidates=("bubble.info",)),
+    Endpoint("dm.create", fields=("organization_id", "user_id"), family="bubble"),
+    Endpoint("bubble.create", fields=("organization_id", "title"), optional=("category_id",), family="bubble"),
+    Endpoint("bubble.invite", fields=("bubbleID", "invitations", "sendemails", "sendsms"), family="bubble",
+             invalidates=("bubble.info", "bubble.membershipsearch", "user.mutualgroups")),
+    Endpoint("bubble.kick", fields=("bubble_id", "users"), family="bubble",
+             invalidates=("bubble.info", "bubble.membershipsearch", "user.mutualgroups")),
+    Endpoint("bubble.update", fields=("bubble_id",), optional=(
+        "title", "category_id", "changetitle", "addmember", "leavegroup", "create_message",
+        "assign_task", "pin_message", "changecategory", "removemember", "create_videosession",
+        "videosessionrecordcloud", "create_announcement",
+    ), family="bubble", invalidates=("bubble.info", "user.mutualgroups")),
+    Endpoint("bubble.pin", path="api/v1/bubble.update", fields=("pinned_message_id", "pinned_message_expires_at"), family="bubble",
+             invalidates=("bubble.info",)),
+    Endpoint("bubble.invitelink", path="api/clients/groups/{bubble_id}/invites", fields=("access", "expires"), path_params=("bubble_id",), family="bubble"),
+    Endpoint("bubble.membershipsearch", fields=("orderby", "includeself", "bubble_id"), optional=("page",), family="bubble", idempotent=True, cache_ttl=300),
+
+    # MESSAGES
+    Endpoint("message.create", fields=("bubble_id", "created_at", "message", "user_id", "uuid"),
+             optional=("parentmessage_id",), defaults={"id": "Null", "messagemedia": []}, family="message"),
+    Endpoint("message.addreaction", fields=("message_id", "reactiontype_id"), family="message"),
+    Endpoint("message.removereaction", fields=("message_id", "reactiontype_id"), family="message"),
+    Endpoint("message.edit", fields=("message", "message_id"), family="message"),
+    Endpoint("message.delete", fields=("message_id",), family="message"),
+    Endpoint("message.search", fields=("query",), optional=("bubble_id", "orderby", "user_ids"),
+             defaults={"search_type": "messages", "size": 25, "from": 0}, family="search", idempotent=True),
+
+    # USERS
+    Endpoint("user.info", fields=("id",), family="user", idempotent=True, cache_ttl=600),
+    Endpoint("user.mutualgroups", fields=("id",), family="user", idempotent=True, cache_ttl=600),
+    Endpoint("user.presence", path="api/clients/users/presence", fields=("data",), family="user"),
+)
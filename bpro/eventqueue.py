@@ -0,0 +1,209 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import threading, time, zlib
+from collections import deque
+
+DROP_OLDEST = "drop_oldest"  # Full queue evicts the oldest droppable event
+DROP_NEWEST = "drop_newest"  # Full queue rejects the incoming event
+NEVER_DROP = "never_drop"    # Full queue pushes back on the producer instead
+
+# Matched against the event name (e.g. App\Events\UserTyping); first match wins
+DEFAULT_POLICIES = (
+    ("UserTyping", DROP_OLDEST),
+    ("UserStoppedTyping", DROP_OLDEST),
+    ("Presence", DROP_OLDEST),
+)
+DEFAULT_POLICY = NEVER_DROP
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_DEPTH = 500
+LATENCY_SAMPLES = 512
+
+class _Shard:
+    """
+    One worker's queue: a single FIFO in arrival order, so a bubble's events are
+    handled in the order Pusher sent them. Entries are (queued_at, event, droppable).
+    """
+    def __init__(self):
+        self.events = deque()
+        self.droppable = 0  # Droppable entries in events, so a full shard knows if it can shed
+        self.cond = threading.Condition()
+        self.max_depth_seen = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    def append(self, item):
+        self.events.append(item)
+        if item[2]:
+            self.droppable += 1
+
+    def popleft(self):
+        item = self.events.popleft()
+        if item[2]:
+            self.droppable -= 1
+        return item
+
+    def shed(self):
+        """Remove the oldest droppable event, skipping over never-drop ones."""
+        for i, item in enumerate(self.events):
+            if item[2]:
+                del self.events[i]
+                self.droppable -= 1
+                return
+
+    def clear(self):
+        self.events.clear()
+        self.droppable = 0
+
+class EventDispatcher:
+    """
+    Bounded hand-off between the WebSocket reader and a pool of handler threads.
+
+    Events are sharded by bubble, so one bubble's events are handled in order by
+    the same worker while different bubbles proceed in parallel. offer() never
+    blocks: droppable events are evicted or rejected when a shard is full, and
+    never-drop events are refused (return False) so the reader can back off.
+    """
+    def __init__(self, handler, workers=DEFAULT_WORKERS, max_depth=DEFAULT_MAX_DEPTH, policies=DEFAULT_POLICIES, default_policy=DEFAULT_POLICY):
+        self.handler = handler
+        self.max_depth = max_depth
+        self.policies = tuple(policies)
+        self.default_policy = default_policy
+        self._shards = [_Shard() for _ in range(max(1, workers))]
+        self._threads = []
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._waits = deque(maxlen=LATENCY_SAMPLES)
+        self.enqueued = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.forced = 0
+        self.errors = 0
+
+    def policy_for(self, event):
+        name = event.get("event", "")
+        for fragment, policy in self.policies:
+            if fragment in name:
+                return policy
+        return self.default_policy
+
+    def _shard(self, event):
+        key = str(event.get("_bubble_id", "")).encode()
+        return self._shards[zlib.crc32(key) % len(self._shards)]
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._work, args=(shard,), name=f"ws-dispatch-{i}", daemon=True)
+            for i, shard in enumerate(self._shards)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, drain=True, timeout=5):
+        """Stop the workers, by default after handling what is already queued."""
+        self._running = False
+        for shard in self._shards:
+            with shard.cond:
+                if not drain:
+                    shard.clear()
+                shard.cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def offer(self, event, force=False):
+        """
+        Queue an event without blocking. Returns False only for a never-drop event
+        that found its shard full; the caller should retry later, or pass force=True
+        to exceed the bound rather than wait any longer.
+        """
+        policy = self.policy_for(event)
+        shard = self._shard(event)
+        item = (time.monotonic(), event, policy != NEVER_DROP)
+        with shard.cond:
+            if len(shard) >= self.max_depth and not force:
+                if policy == NEVER_DROP:
+                    if not shard.droppable:
+                        with self._stats_lock:
+                            self.rejected += 1
+                        return False
+                    shard.shed()  # Make room by shedding a droppable event
+                    self._count_drop()
+                elif policy == DROP_OLDEST and shard.droppable:
+                    shard.shed()
+                    self._count_drop()
+                else:
+                    self._count_drop()
+                    return True
+            shard.append(item)
+            shard.max_depth_seen = max(shard.max_depth_seen, len(shard))
+            shard.cond.notify()
+        with self._stats_lock:
+            self.enqueued += 1
+            if force:
+                self.forced += 1
+        return True
+
+    def _count_drop(self):
+        with self._stats_lock:
+            self.dropped += 1
+
+    def _work(self, shard):
+        while True:
+            with shard.cond:
+                while not len(shard) and self._running:
+                    shard.cond.wait()
+                if not len(shard):
+                    return
+                queued_at, event, _ = shard.popleft()
+            started = time.monotonic()
+            try:
+                self.handler(event)
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                print(f"Error handling event {event.get('event')} for bubble {event.get('_bubble_id')}: {e}")
+            finished = time.monotonic()
+            with self._stats_lock:
+                self.dispatched += 1
+                self._waits.append(started - queued_at)
+                self._latencies.append(finished - started)
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {"avg_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(samples)
+        return {
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+    def snapshot(self):
+        """Queue depth, drop counters, and queue-wait / handler latency over recent events."""
+        with self._stats_lock:
+            waits, latencies = list(self._waits), list(self._latencies)
+            counters = {
+                "enqueued": self.enqueued,
+                "dispatched": self.dispatched,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "forced": self.forced,
+                "errors": self.errors,
+            }
+        return dict(
+            counters,
+            depth=sum(len(shard) for shard in self._shards),
+            max_depth_seen=max(shard.max_depth_seen for shard in self._shards),
+            max_depth=self.max_depth,
+            workers=len(self._shards),
+            queue_wait=self._summary(waits),
+            handler=self._summary(latencies),
+        )
@@ -0,0 +1,257 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import gzip, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .atomicfile import atomic_write_json
+from .servermode import offload
+
+FORMATS = {"ndjson": ".ndjson", "ndjson.gz": ".ndjson.gz"}
+DEFAULT_FORMAT = "ndjson.gz"
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 1000
+MANIFEST_NAME = "manifest.json"
+# Seconds between manifest checkpoints while a bubble is written; each finished bubble is
+# checkpointed too, so an interrupted export redoes at most this much work per bubble
+CHECKPOINT_INTERVAL = 5.0
+# bubble.history pages fetched per backfill call while closing a gap before export
+GAP_PAGES_PER_CALL = 10
+
+def parse_bubble_ids(bubble_ids):
+    """Bubble ids as ints; they name the output files, so anything else is rejected."""
+    if isinstance(bubble_ids, (str, bytes, int)) or not hasattr(bubble_ids, "__iter__"):
+        raise ValueError("bubble ids must be a list")
+    parsed = []
+    for bubble_id in bubble_ids:
+        try:
+            if isinstance(bubble_id, bool):
+                raise ValueError
+            parsed.append(int(bubble_id))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid bubble id {bubble_id!r}") from None
+    return parsed
+
+def encode_batches(batches):
+    """(last message_id, count, NDJSON bytes) for each batch of (message_id, JSON text) rows."""
+    for rows in batches:
+        yield rows[-1][0], len(rows), "".join(body + "\n" for _, body in rows).encode("utf-8")
+
+def gzip_members(chunks, level=6):
+    """
+    Compress each chunk as its own gzip member. Concatenated members are still
+    one valid .gz file, and every checkpoint lands on a member boundary, so a
+    resumed export can truncate back to it and append.
+    """
+    for last_id, count, data in chunks:
+        yield last_id, count, len(data), gzip.compress(data, compresslevel=level)
+
+def plain(chunks):
+    for last_id, count, data in chunks:
+        yield last_id, count, len(data), data
+
+class Exporter:
+    """
+    Streams bubble archives from the MessageStore to one file per bubble under
+    out_dir, a batch at a time, so memory stays flat however large the history.
+
+    Progress is checkpointed (message id + file offset) in manifest.json every
+    checkpoint_interval seconds and when a bubble finishes, so the manifest is
+    rewritten a bounded number of times however many batches there are. An
+    interrupted export truncates anything after the last checkpoint and resumes
+    from it. With a MessageSync and access token, bubbles
+    whose history is not fully synced are paged in from bubble.history first.
+    """
+    def __init__(self, store, sync=None, get_access_token=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.store = store
+        self.sync = sync
+        self.get_access_token = get_access_token
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._running = False
+        self._progress = {}
+        self._last = None
+
+    def _manifest_path(self, out_dir):
+        return os.path.join(out_dir, MANIFEST_NAME)
+
+    def _load_manifest(self, out_dir, fmt):
+        path = self._manifest_path(out_dir)
+        if not os.path.exists(path):
+            return {"format": fmt, "bubbles": {}}
+        with open(path, "r") as file:
+            manifest = json.load(file)
+        if manifest.get("format") != fmt:
+            raise ValueError(f"{out_dir} holds a {manifest.get('format')} export; use that format or a new folder to resume")
+        return manifest
+
+    def _checkpoint(self, file, out_dir, manifest, bubble_id, entry):
+        # The file is synced first, so a checkpoint never points past durable data
+        offload(os.fsync, file.fileno())
+        with self._lock:
+            manifest["bubbles"][str(bubble_id)] = entry
+            atomic_write_json(self._manifest_path(out_dir), manifest)
+
+    def _fill_gaps(self, bubble_id):
+        access_token = self.get_access_token() if self.get_access_token else None
+        if self.sync is None or not access_token:
+            return
+        self.sync.sync_latest(access_token, bubble_id)
+        while not self.store.get_sync_state(bubble_id)["complete"]:
+            if not self.sync.backfill(access_token, bubble_id, pages=GAP_PAGES_PER_CALL)["pages"]:
+                break
+
+    @staticmethod
+    def _append(file, data):
+        file.write(data)
+        file.flush()
+        return file.tell()
+
+    def _export_bubble(self, bubble_id, out_dir, fmt, manifest, batch_size, fetch_gaps):
+        entry = dict(manifest["bubbles"].get(str(bubble_id)) or {"last_id": None, "offset": 0, "messages": 0, "bytes": 0})
+        if fetch_gaps:
+            self._fill_gaps(bubble_id)
+        started = time.monotonic()
+        messages = raw_bytes = 0
+        path = os.path.join(out_dir, f"{bubble_id}{FORMATS[fmt]}")
+        encode = gzip_members if fmt == "ndjson.gz" else plain
+        with open(path, "ab") as file:
+            # Drop anything written after the last checkpoint
+            file.truncate(entry["offset"])
+            file.seek(entry["offset"])
+            chunks = encode(encode_batches(self.store.iter_export_rows(bubble_id, entry["last_id"], batch_size)))
+            checkpointed, last_checkpoint = entry, time.monotonic()
+            while True:
+                # Reads, compression and fsyncs go to a real thread in gevent mode; the manifest
+                # update stays here, since its lock is shared with other greenlets
+                chunk = offload(next, chunks, None)
+                if chunk is None:
+                    break
+                last_id, count, size, data = chunk
+                offset = offload(self._append, file, data)
+                messages += count
+                raw_bytes += size
+                entry = {
+                    "last_id": last_id,
+                    "offset": offset,
+                    "messages": entry["messages"] + count,
+                    "bytes": entry["bytes"] + size,
+                }
+                self._progress[bubble_id] = entry["messages"]
+                if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint(file, out_dir, manifest, bubble_id, entry)
+                    checkpointed, last_checkpoint = entry, time.monotonic()
+            if entry is not checkpointed:
+                self._checkpoint(file, out_dir, manifest, bubble_id, entry)
+        return {
+            "bubble_id": bubble_id,
+            "messages": messages,
+            "bytes": raw_bytes,
+            "written": entry["offset"],
+            "seconds": time.monotonic() - started,
+        }
+
+    def check(self, out_dir, fmt):
+        """Raise ValueError for an unknown format, or one that cannot resume the export in out_dir."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        self._load_manifest(out_dir, fmt)
+
+    def try_start(self):
+        """
+        Claim the exporter for one run; False if an export is already running. Lets a
+        caller refuse a second export before handing the first to a background task,
+        which must then call export(..., claimed=True).
+        """
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            self._progress = {}
+            return True
+
+    def export(self, bubble_ids, out_dir, fmt=DEFAULT_FORMAT, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, fetch_gaps=False, claimed=False):
+        """
+        Export bubbles in parallel and return throughput stats. Messages and bytes
+        count only what this run wrote, so a resumed run reports the remainder.
+        """
+        if not claimed and not self.try_start():
+            raise RuntimeError("An export is already running")
+        try:
+            bubble_ids = parse_bubble_ids(bubble_ids)
+            self.check(out_dir, fmt)
+            os.makedirs(out_dir, exist_ok=True)
+            manifest = self._load_manifest(out_dir, fmt)
+            started = time.monotonic()
+            results, errors = [], {}
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="export") as pool:
+                futures = {pool.submit(self._export_bubble, bubble_id, out_dir, fmt, manifest, batch_size, fetch_gaps): bubble_id for bubble_id in bubble_ids}
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        errors[futures[future]] = str(e)
+                        print(f"Error exporting bubble {futures[future]}: {e}")
+            elapsed = max(time.monotonic() - started, 1e-9)
+            messages = sum(result["messages"] for result in results)
+            raw_bytes = sum(result["bytes"] for result in results)
+            self._last = {
+                "out_dir": out_dir,
+                "format": fmt,
+                "bubbles": len(results),
+                "errors": errors,
+                "messages": messages,
+                "bytes": raw_bytes,
+                "seconds": round(elapsed, 3),
+                "mb_per_second": round(raw_bytes / elapsed / 1e6, 2),
+                "messages_per_second": round(messages / elapsed),
+            }
+            print(f"Exported {messages} messages from {len(results)} bubbles to {out_dir} "
+                  f"({self._last['mb_per_second']} MB/s, {self._last['messages_per_second']} msgs/s)")
+            return self._last
+        finally:
+            with self._lock:
+                self._running = False
+
+    def progress(self):
+        return {
+            "running": self._running,
+            "messages_exported": sum(self._progress.values()),
+            "bubbles_started": len(self._progress),
+            "last": self._last,
+        }
+
+def benchmark(messages=200000, bubbles=8, workers=4):
+    """Export a synthetic archive in each format and print MB/s and messages/s."""
+    import shutil, tempfile
+    from .messagestore import MessageStore
+    workdir = tempfile.mkdtemp(prefix="bpro-export-bench-")
+    try:
+        store = MessageStore(os.path.join(workdir, "messages.db"))
+        per_bubble = messages // bubbles
+        for bubble_id in range(1, bubbles + 1):
+            base = bubble_id * per_bubble * 10
+            store.upsert_messages(bubble_id, [
+                {
+                    "id": base + i,
+                    "bubble_id": bubble_id,
+                    "created_at": "2025-01-01 12:00:00",
+                    "message": f"Benchmark message {i} in bubble {bubble_id}, long enough to look like a real chat line.",
+                    "user": {"id": i % 50, "fullname": f"User {i % 50}"},
+                    "reactionsummary": [],
+                }
+                for i in range(per_bubble)
+            ])
+        exporter = Exporter(store)
+        for fmt in FORMATS:
+            for n in (1, workers):
+                out_dir = os.path.join(workdir, f"{fmt}-{n}")
+                stats = exporter.export(range(1, bubbles + 1), out_dir, fmt=fmt, workers=n)
+                written = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir) if name != MANIFEST_NAME)
+                print(f"{fmt:10} workers={n}: {stats['messages']} msgs, {stats['bytes'] / 1e6:.1f} MB -> {written / 1e6:.1f} MB "
+                      f"in {stats['seconds']:.2f}s = {stats['mb_per_second']} MB/s, {stats['messages_per_second']} msgs/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,450 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from .codec import get_codec, decode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY,
+    bubble_id INTEGER NOT NULL,
+    created_at TEXT,
+    parent_message_id INTEGER,
+    author TEXT,
+    content TEXT,
+    detail TEXT NOT NULL,
+    raw TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_bubble ON messages (bubble_id, message_id);
+CREATE INDEX IF NOT EXISTS idx_messages_bubble_time ON messages (bubble_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_parent ON messages (parent_message_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    bubble_id INTEGER PRIMARY KEY,
+    high_water INTEGER,
+    low_water INTEGER,
+    complete INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS bubble_locations (
+    bubble_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over message content and author, kept in step with messages by triggers.
+# External content: the text lives only in messages, the index stores just the tokens.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, author, content='messages', content_rowid='message_id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content, author) VALUES (new.message_id, new.content, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, author) VALUES ('delete', old.message_id, old.content, old.author);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, author ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, author) VALUES ('delete', old.message_id, old.content, old.author);
+    INSERT INTO messages_fts (rowid, content, author) VALUES (new.message_id, new.content, new.author);
+END;
+"""
+
+UPSERT = """
+INSERT INTO messages (message_id, bubble_id, created_at, parent_message_id, author, content, detail, raw)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (message_id) DO UPDATE SET
+    bubble_id = excluded.bubble_id,
+    created_at = excluded.created_at,
+    parent_message_id = excluded.parent_message_id,
+    author = excluded.author,
+    content = excluded.content,
+    detail = excluded.detail,
+    raw = COALESCE(excluded.raw, messages.raw)
+"""
+
+SET_SYNC_STATE = """
+INSERT INTO sync_state (bubble_id, high_water, low_water, complete, updated_at)
+VALUES (?, ?, ?, ?, strftime('%s', 'now'))
+ON CONFLICT (bubble_id) DO UPDATE SET
+    high_water = excluded.high_water,
+    low_water = excluded.low_water,
+    complete = excluded.complete,
+    updated_at = excluded.updated_at
+"""
+
+def detail_message(message):
+    """Reduce a raw bubble.history message to the shape the frontend renders."""
+    user = message.get("user") or {}
+    return {
+        "time_of_sending": message.get("created_at"),
+        "author": user.get("fullname"),
+        "profilepicurl": user.get("profilepicurl"),
+        "message_id": message.get("id"),
+        "edit_count": message.get("user_edited_version", 0),
+        "last_edited": message.get("user_edited_at"),
+        "parent_message": message.get("parentmessage_id"),
+        "reactions": message.get("reactionsummary", []),
+        "content": message.get("message", ""),
+    }
+
+class MessageStore:
+    """
+    SQLite (WAL mode) store for bubble messages, keyed by bubble_id and message_id.
+    Each thread gets its own connection; WAL lets readers run alongside a writer.
+    """
+    def __init__(self, db_path, codec=None):
+        self.db_path = db_path
+        # Encodes the detail/raw payload columns; rows from any codec can be read back
+        self.codec = codec or get_codec()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        self.fts_enabled = self._init_fts(conn)
+
+    def _init_fts(self, conn):
+        """Create the search index, filling it once for messages stored before it existed."""
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, searches will go to the server: {e}")
+            return False
+        if not self.get_meta("fts_indexed"):
+            with conn:
+                conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            self.set_meta("fts_indexed", "1")
+            print(f"Indexed {self.count()} messages for search")
+        return True
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _row(self, bubble_id, detail, raw=None):
+        return (
+            int(detail["message_id"]),
+            int(bubble_id),
+            detail.get("time_of_sending"),
+            detail.get("parent_message"),
+            detail.get("author"),
+            detail.get("content"),
+            self.codec.dumps(detail),
+            self.codec.dumps(raw) if raw is not None else None,
+        )
+
+    def upsert_messages(self, bubble_id, messages):
+        """Insert or update raw bubble.history messages. Returns their detailed form."""
+        detailed, rows = [], []
+        for message in messages:
+            if not isinstance(message, dict) or message.get("id") is None:
+                continue
+            detail = detail_message(message)
+            detailed.append(detail)
+            rows.append(self._row(bubble_id, detail, message))
+        self._write(rows)
+        return detailed
+
+    def upsert_detailed(self, bubble_id, detailed_messages):
+        """Insert or update messages already in the detailed shape (no raw payload)."""
+        rows = [
+            self._row(bubble_id, detail)
+            for detail in detailed_messages
+            if isinstance(detail, dict) and detail.get("message_id") is not None
+        ]
+        self._write(rows)
+
+    def _write(self, rows):
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(UPSERT, rows)
+
+    def write_batch(self, messages, states):
+        """
+        Write {bubble_id: [(detail, raw), ...]} and {bubble_id: (high_water, low_water, complete)}
+        in one transaction, so sync cursors never get ahead of the messages they cover.
+        """
+        rows = [self._row(bubble_id, detail, raw) for bubble_id, items in messages.items() for detail, raw in items]
+        conn = self._conn()
+        with conn:
+            if rows:
+                conn.executemany(UPSERT, rows)
+            for bubble_id, (high_water, low_water, complete) in states.items():
+                conn.execute(SET_SYNC_STATE, (int(bubble_id), high_water, low_water, int(bool(complete))))
+
+    def patch_message(self, message_id, **changes):
+        """Update fields of a stored message's detail. Returns the new detail, or None if unknown."""
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT detail FROM messages WHERE message_id = ?", (int(message_id),)).fetchone()
+            if row is None:
+                return None
+            detail = decode(row["detail"])
+            detail.update(changes)
+            conn.execute(
+                "UPDATE messages SET detail = ?, content = ? WHERE message_id = ?",
+                (self.codec.dumps(detail), detail.get("content"), int(message_id)),
+            )
+        return detail
+
+    def delete_message(self, message_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE message_id = ?", (int(message_id),))
+
+    def get_messages(self, bubble_id, limit=None, before_id=None, after_id=None, since=None, until=None, newest_first=True):
+        """
+        Detailed messages for a bubble, optionally bounded by message id
+        (exclusive) or created_at time (inclusive, 'YYYY-MM-DD HH:MM:SS').
+        """
+        clauses, params = ["bubble_id = ?"], [int(bubble_id)]
+        if before_id is not None:
+            clauses.append("message_id < ?")
+            params.append(int(before_id))
+        if after_id is not None:
+            clauses.append("message_id > ?")
+            params.append(int(after_id))
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at <= ?")
+            params.append(until)
+        sql = f"SELECT detail FROM messages WHERE {' AND '.join(clauses)} ORDER BY message_id {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [decode(row["detail"]) for row in self._conn().execute(sql, params)]
+
+    def iter_export_rows(self, bubble_id, after_id=None, batch_size=1000):
+        """
+        Yield batches of (message_id, JSON text) in message_id order, preferring the
+        raw bubble.history payload. JSON-encoded rows are passed through unparsed.
+        """
+        last_id = -1 if after_id is None else int(after_id)
+        while True:
+            # Looked up per batch: under gevent each batch may be read on a different pool thread
+            rows = self._conn().execute(
+                "SELECT message_id, COALESCE(raw, detail) AS body FROM messages WHERE bubble_id = ? AND message_id > ? ORDER BY message_id LIMIT ?",
+                (int(bubble_id), last_id, int(batch_size)),
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]["message_id"]
+            yield [
+                (row["message_id"], row["body"] if isinstance(row["body"], str) else json.dumps(decode(row["body"]), separators=(",", ":"), ensure_ascii=False))
+                for row in rows
+            ]
+
+    def get_replies(self, parent_message_id):
+        rows = self._conn().execute(
+            "SELECT detail FROM messages WHERE parent_message_id = ? ORDER BY message_id",
+            (int(parent_message_id),),
+        )
+        return [decode(row["detail"]) for row in rows]
+
+    @staticmethod
+    def _fts_query(text):
+        """Quote each word so user input is never parsed as FTS5 syntax; the last word matches as a prefix."""
+        terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+        if terms:
+            terms[-1] += "*"
+        return " ".join(terms)
+
+    def search(self, query, bubble_id=None, author=None, limit=25, offset=0):
+        """
+        Ranked (bm25) local matches for query, optionally within one bubble and/or
+        from authors whose name contains author. Each result is the detailed
+        message plus bubble_id and rank. Returns None when FTS5 is unavailable.
+        """
+        if not self.fts_enabled:
+            return None
+        match = self._fts_query(query)
+        if not match:
+            return []
+        clauses, params = ["messages_fts MATCH ?"], [match]
+        if bubble_id is not None:
+            clauses.append("m.bubble_id = ?")
+            params.append(int(bubble_id))
+        if author:
+            clauses.append("m.author LIKE ?")
+            params.append(f"%{author}%")
+        sql = (
+            "SELECT m.bubble_id, m.detail, bm25(messages_fts) AS rank FROM messages_fts "
+            "JOIN messages m ON m.message_id = messages_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} ORDER BY rank LIMIT ? OFFSET ?"
+        )
+        params += [int(limit), int(offset)]
+        results = []
+        for row in self._conn().execute(sql, params):
+            detail = decode(row["detail"])
+            detail["bubble_id"] = row["bubble_id"]
+            detail["rank"] = round(row["rank"], 4)
+            results.append(detail)
+        return results
+
+    def count(self, bubble_id=None):
+        if bubble_id is None:
+            return self._conn().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM messages WHERE bubble_id = ?", (int(bubble_id),)).fetchone()[0]
+
+    def count_by_bubble(self):
+        rows = self._conn().execute("SELECT bubble_id, COUNT(*) AS n FROM messages GROUP BY bubble_id")
+        return {row["bubble_id"]: row["n"] for row in rows}
+
+    def get_sync_states(self):
+        """Sync cursors for every bubble that has been synced, keyed by bubble_id."""
+        rows = self._conn().execute("SELECT bubble_id, high_water, low_water, complete, updated_at FROM sync_state")
+        return {
+            row["bubble_id"]: {"high_water": row["high_water"], "low_water": row["low_water"], "complete": bool(row["complete"]), "updated_at": row["updated_at"]}
+            for row in rows
+        }
+
+    def get_sync_state(self, bubble_id):
+        """
+        Sync cursors for a bubble: messages from low_water to high_water are stored
+        contiguously, and complete means low_water is the bubble's first message.
+        """
+        row = self._conn().execute(
+            "SELECT high_water, low_water, complete, updated_at FROM sync_state WHERE bubble_id = ?",
+            (int(bubble_id),),
+        ).fetchone()
+        if row is None:
+            return {"high_water": None, "low_water": None, "complete": False, "updated_at": None}
+        return {"high_water": row["high_water"], "low_water": row["low_water"], "complete": bool(row["complete"]), "updated_at": row["updated_at"]}
+
+    def set_sync_state(self, bubble_id, high_water, low_water, complete):
+        conn = self._conn()
+        with conn:
+            conn.execute(SET_SYNC_STATE, (int(bubble_id), high_water, low_water, int(bool(complete))))
+
+    def get_bubble_location(self, bubble_id):
+        row = self._conn().execute("SELECT path FROM bubble_locations WHERE bubble_id = ?", (int(bubble_id),)).fetchone()
+        return row["path"] if row else None
+
+    def get_bubble_locations(self):
+        return {row["bubble_id"]: row["path"] for row in self._conn().execute("SELECT bubble_id, path FROM bubble_locations")}
+
+    def set_bubble_locations(self, locations):
+        """Record {bubble_id: folder path} entries, replacing existing ones."""
+        if not locations:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO bubble_locations (bubble_id, path) VALUES (?, ?) ON CONFLICT (bubble_id) DO UPDATE SET path = excluded.path",
+                [(int(bubble_id), path) for bubble_id, path in locations.items()],
+            )
+
+    def rebuild_bubble_locations(self, bubbles_path):
+        """
+        Index the bubbles/<group>/<bubble_id> folders so later lookups are a single
+        primary-key read. Only scans the disk when the index is empty.
+        """
+        if self._conn().execute("SELECT 1 FROM bubble_locations LIMIT 1").fetchone():
+            return 0
+        locations = {}
+        for group in os.scandir(bubbles_path) if os.path.isdir(bubbles_path) else ():
+            if not group.is_dir():
+                continue
+            for entry in os.scandir(group.path):
+                if entry.is_dir() and entry.name.isdigit():
+                    locations[int(entry.name)] = entry.path
+        self.set_bubble_locations(locations)
+        print(f"Indexed {len(locations)} bubble folders under {bubbles_path}")
+        return len(locations)
+
+    def migrate_codec(self, codec, batch_size=1000):
+        """
+        Re-encode every stored payload with codec, one committed batch at a time.
+        The cursor is kept in meta, so an interrupted migration picks up where it
+        stopped. Returns the number of messages rewritten.
+        """
+        self.codec = codec
+        cursor_key = f"codec_migration:{codec.name}"
+        last_id = int(self.get_meta(cursor_key, -1))
+        conn = self._conn()
+        migrated, started = 0, time.monotonic()
+        while True:
+            rows = conn.execute(
+                "SELECT message_id, detail, raw FROM messages WHERE message_id > ? ORDER BY message_id LIMIT ?",
+                (last_id, int(batch_size)),
+            ).fetchall()
+            if not rows:
+                break
+            updates = [
+                (codec.dumps(decode(row["detail"])), codec.dumps(decode(row["raw"])) if row["raw"] is not None else None, row["message_id"])
+                for row in rows
+            ]
+            last_id = rows[-1]["message_id"]
+            with conn:
+                conn.executemany("UPDATE messages SET detail = ?, raw = ? WHERE message_id = ?", updates)
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (cursor_key, str(last_id)))
+            migrated += len(rows)
+        self.set_meta("storage_codec", codec.name)
+        with conn:
+            conn.execute("DELETE FROM meta WHERE key = ?", (cursor_key,))
+        print(f"Re-encoded {migrated} messages as {codec.name} in {time.monotonic() - started:.1f}s")
+        return migrated
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def migrate_json_chats(self, chats_path):
+        """
+        One-time import of the old chats/<bubble_id>/messages.json layout.
+        Raw messages from fullmessages.json are preferred when present.
+        The JSON files are left in place. Returns the number of bubbles imported.
+        """
+        if self.get_meta("json_migrated"):
+            return 0
+        imported = 0
+        for entry in os.scandir(chats_path) if os.path.isdir(chats_path) else ():
+            if not entry.is_dir() or not entry.name.isdigit():
+                continue
+            try:
+                raw_messages = self._load_messages(os.path.join(entry.path, "fullmessages.json"))
+                if raw_messages and all("id" in message for message in raw_messages):
+                    self.upsert_messages(entry.name, raw_messages)
+                else:
+                    self.upsert_detailed(entry.name, self._load_messages(os.path.join(entry.path, "messages.json")))
+                imported += 1
+            except Exception as e:
+                print(f"Error migrating messages for bubble {entry.name}: {e}")
+        self.set_meta("json_migrated", "1")
+        print(f"Migrated messages for {imported} bubbles into {self.db_path}")
+        return imported
+
+    @staticmethod
+    def _load_messages(path):
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+        except json.JSONDecodeError:
+            return []
+        messages = data.get("messages", []) if isinstance(data, dict) else []
+        return [message for message in messages if isinstance(message, dict)]
@@ -0,0 +1,459 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+# Middleware for the Pronto request pipeline.
+# A middleware is called as middleware(request, call_next) by Pronto and
+# awaited as middleware.acall(request, call_next) by AsyncPronto.
+
+import asyncio, json, random, threading, time
+from collections import OrderedDict
+
+class RequestMetrics:
+    """Per-endpoint call counts, failures and latency."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _record(self, name, elapsed, ok):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0}
+            stats["calls"] += 1
+            if not ok:
+                stats["errors"] += 1
+            stats["total_time"] += elapsed
+            if elapsed > stats["max_time"]:
+                stats["max_time"] = elapsed
+
+    def __call__(self, request, call_next):
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = call_next(request)
+            ok = True
+            return result
+        finally:
+            self._record(request.endpoint.name, time.perf_counter() - start, ok)
+
+    async def acall(self, request, call_next):
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = await call_next(request)
+            ok = True
+            return result
+        finally:
+            self._record(request.endpoint.name, time.perf_counter() - start, ok)
+
+    def snapshot(self):
+        """Return {endpoint: {calls, errors, total_time, max_time, avg_time}}."""
+        with self._lock:
+            return {
+                name: {**stats, "avg_time": stats["total_time"] / stats["calls"]}
+                for name, stats in self._stats.items()
+            }
+
+# Requests per second and burst size for each endpoint family
+DEFAULT_RATE_LIMITS = {
+    "auth": (1, 3),
+    "bubble": (10, 20),
+    "message": (5, 10),
+    "user": (10, 20),
+    "search": (2, 5),
+    "pusher": (20, 50),
+    "default": (10, 20),
+}
+
+# Status codes worth another attempt. Errors without a response are retried only
+# when the client marked them transient (connection failures and timeouts)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Most a single call may spend sleeping between attempts; a longer Retry-After fails
+# fast and leaves the rate limiter to hold back later calls
+DEFAULT_RETRY_BUDGET = 10.0
+
+class TokenBucket:
+    """
+    Token bucket whose refill rate adapts: it halves on a 429 and creeps back
+    to the configured rate on success. A Retry-After pauses it outright.
+    """
+    def __init__(self, rate, capacity, min_rate=0.2):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def throttled(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class RateLimiter:
+    """Per endpoint-family token buckets that honour 429 Retry-After."""
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_RATE_LIMITS, **(limits or {}))
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.counters = {"throttled": 0, "rate_limited": 0}
+
+    def bucket(self, family):
+        bucket = self._buckets.get(family)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(family)
+                if bucket is None:
+                    rate, capacity = self.limits.get(family, self.limits["default"])
+                    bucket = self._buckets[family] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _on_error(self, bucket, err):
+        if getattr(err, "status_code", None) == 429:
+            self._count("rate_limited")
+            bucket.throttled(getattr(err, "retry_after", None))
+
+    def __call__(self, request, call_next):
+        bucket = self.bucket(request.endpoint.family)
+        wait = bucket.reserve()
+        if wait > 0:
+            self._count("throttled")
+            time.sleep(wait)
+        try:
+            result = call_next(request)
+        except Exception as err:
+            self._on_error(bucket, err)
+            raise
+        bucket.succeeded()
+        return result
+
+    async def acall(self, request, call_next):
+        bucket = self.bucket(request.endpoint.family)
+        wait = bucket.reserve()
+        if wait > 0:
+            self._count("throttled")
+            await asyncio.sleep(wait)
+        try:
+            result = await call_next(request)
+        except Exception as err:
+            self._on_error(bucket, err)
+            raise
+        bucket.succeeded()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "families": {family: round(bucket.rate, 2) for family, bucket in self._buckets.items()},
+            }
+
+class RetryPolicy:
+    """
+    Jittered exponential retry for idempotent endpoints, and for
+    message.create when it carries a uuid the server can dedupe on.
+    """
+    def __init__(self, max_attempts=4, base_delay=0.25, max_delay=8.0, budget=DEFAULT_RETRY_BUDGET):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.counters = {"retried": 0, "gave_up": 0}
+
+    @staticmethod
+    def retryable(request):
+        return request.endpoint.idempotent or bool(request.payload and request.payload.get("uuid"))
+
+    def _delay(self, err, attempt, waited):
+        status_code = getattr(err, "status_code", None)
+        if status_code is None:
+            if not getattr(err, "transient", False):
+                return None
+        elif status_code not in RETRYABLE_STATUSES:
+            return None
+        retry_after = getattr(err, "retry_after", None)
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            # Full jitter keeps a burst of failed callers from retrying in lockstep
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if attempt >= self.max_attempts or waited + delay > self.budget:
+            with self._lock:
+                self.counters["gave_up"] += 1
+            return None
+        with self._lock:
+            self.counters["retried"] += 1
+        return delay
+
+    def __call__(self, request, call_next):
+        if not self.retryable(request):
+            return call_next(request)
+        attempt, waited = 1, 0.0
+        while True:
+            try:
+                return call_next(request)
+            except Exception as err:
+                delay = self._delay(err, attempt, waited)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+            waited += delay
+
+    async def acall(self, request, call_next):
+        if not self.retryable(request):
+            return await call_next(request)
+        attempt, waited = 1, 0.0
+        while True:
+            try:
+                return await call_next(request)
+            except Exception as err:
+                delay = self._delay(err, attempt, waited)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            waited += delay
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight reads: concurrent calls with the same
+    endpoint, token and payload share one upstream request and one parsed
+    result. The shared result must be treated as read-only by callers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    @staticmethod
+    def key(request):
+        return (request.endpoint.name, request.access_token, request.url,
+                json.dumps(request.payload, sort_keys=True, separators=(",", ":"), default=str))
+
+    def __call__(self, request, call_next):
+        if not request.endpoint.idempotent:
+            return call_next(request)
+        key = self.key(request)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.counters["leaders"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = call_next(request)
+            return flight.result
+        except Exception as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def acall(self, request, call_next):
+        if not request.endpoint.idempotent:
+            return await call_next(request)
+        key = self.key(request)
+        task = self._async_flights.get(key)
+        if task is None:
+            # The upstream call is its own task, so it belongs to no single caller
+            task = self._async_flights[key] = asyncio.ensure_future(call_next(request))
+            task.add_done_callback(lambda done: self._land(key, done))
+            with self._lock:
+                self.counters["leaders"] += 1
+        else:
+            with self._lock:
+                self.counters["coalesced"] += 1
+        # Shielded: a caller being cancelled, leader included, leaves the call running for the rest
+        return await asyncio.shield(task)
+
+    def _land(self, key, task):
+        if self._async_flights.get(key) is task:
+            del self._async_flights[key]
+        if not task.cancelled():
+            # Mark retrieved so a failure nobody is still waiting for doesn't log a warning
+            task.exception()
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.counters, "in_flight": len(self._flights) + len(self._async_flights)}
+
+# WebSocket event name fragments -> cached endpoints they make stale.
+# Scope says which id in the event selects the entries: the event's bubble or a user.
+# user.mutualgroups is cached per user, so bubble-scoped events drop every user's entry.
+EVENT_INVALIDATIONS = (
+    ("Membership", ("bubble.info", "bubble.membershipsearch", "user.mutualgroups"), "bubble"),
+    ("BubbleUpdated", ("bubble.info",), "bubble"),
+    ("BubbleRemoved", ("bubble.info", "bubble.membershipsearch", "user.mutualgroups"), "bubble"),
+    ("UserUpdated", ("user.info", "user.mutualgroups"), "user"),
+    ("UserRemoved", ("user.info", "user.mutualgroups"), "user"),
+)
+
+def _payload_bubble_id(payload):
+    if not payload:
+        return None
+    bubble_id = payload.get("bubble_id", payload.get("bubbleID"))
+    return str(bubble_id) if bubble_id is not None else None
+
+class ResponseCache:
+    """
+    Size-bounded LRU of read responses with a TTL per endpoint (Endpoint.cache_ttl).
+    Writes evict what their Endpoint.invalidates names, and WebSocket events can
+    evict through invalidate_for_event(). Cached results are shared; treat them as read-only.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, endpoint_name, bubble_id, user_id, result)
+        self._generation = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return True, entry[4]
+                del self._entries[key]
+                self.counters["expirations"] += 1
+            self.counters["misses"] += 1
+            return False, self._generation
+
+    def _store(self, request, key, generation, result):
+        endpoint = request.endpoint
+        user_id = request.payload.get("id") if endpoint.family == "user" and request.payload else None
+        entry = (time.monotonic() + endpoint.cache_ttl, endpoint.name,
+                 _payload_bubble_id(request.payload), None if user_id is None else str(user_id), result)
+        with self._lock:
+            # An invalidation ran while this was in flight, so the result may already be stale
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _after_write(self, request):
+        if request.endpoint.invalidates:
+            self.invalidate(request.endpoint.invalidates, bubble_id=_payload_bubble_id(request.payload))
+
+    def __call__(self, request, call_next):
+        if request.endpoint.cache_ttl is None:
+            result = call_next(request)
+            self._after_write(request)
+            return result
+        key = SingleFlight.key(request)
+        hit, value = self._lookup(key)
+        if hit:
+            return value
+        result = call_next(request)
+        self._store(request, key, value, result)
+        return result
+
+    async def acall(self, request, call_next):
+        if request.endpoint.cache_ttl is None:
+            result = await call_next(request)
+            self._after_write(request)
+            return result
+        key = SingleFlight.key(request)
+        hit, value = self._lookup(key)
+        if hit:
+            return value
+        result = await call_next(request)
+        self._store(request, key, value, result)
+        return result
+
+    def invalidate(self, endpoints=None, bubble_id=None, user_id=None):
+        """
+        Drop entries for the given endpoint names (all when None), narrowed to
+        one bubble or user when given. Entries not keyed by that id (e.g.
+        user.mutualgroups for a bubble) cannot be matched, so they are dropped
+        too. Returns how many entries were removed.
+        """
+        if isinstance(endpoints, str):
+            endpoints = (endpoints,)
+        bubble_id = None if bubble_id is None else str(bubble_id)
+        user_id = None if user_id is None else str(user_id)
+        with self._lock:
+            self._generation += 1
+            stale = [
+                key for key, (_, name, entry_bubble, entry_user, _) in self._entries.items()
+                if (endpoints is None or name in endpoints)
+                and (bubble_id is None or entry_bubble in (None, bubble_id))
+                and (user_id is None or entry_user in (None, user_id))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.counters["invalidations"] += len(stale)
+            return len(stale)
+
+    def invalidate_for_event(self, event_name, bubble_id=None, data=None):
+        """Evict entries made stale by a WebSocket event, using EVENT_INVALIDATIONS."""
+        removed = 0
+        for fragment, endpoints, scope in EVENT_INVALIDATIONS:
+            if fragment not in event_name:
+                continue
+            if scope == "bubble":
+                removed += self.invalidate(endpoints, bubble_id=bubble_id)
+            else:
+                user_id = (data or {}).get("user_id") or ((data or {}).get("user") or {}).get("id")
+                removed += self.invalidate(endpoints, user_id=user_id)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.counters, "size": len(self._entries), "max_entries": self.max_entries}
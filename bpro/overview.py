@@ -0,0 +1,219 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import hashlib
+import json
+import os
+import threading
+from .atomicfile import atomic_write_json
+
+def parse_overview(data):
+    """Build every sidebar view from a bubble.list response in one pass."""
+    bubbles = data["bubbles"]
+    stats = data["stats"]
+
+    # Separate and sort DM bubbles by name
+    sorted_dm_bubbles = sorted(
+        [{"id": bubble["id"], "title": bubble["title"]} for bubble in bubbles if bubble.get("isdm")],
+        key=lambda x: x["title"]
+    )
+
+    # Categorize and sort Non-DM bubbles
+    categorizedgroups = {}
+    uncategorizedgroups = []
+    for bubble in (b for b in bubbles if not b.get("isdm")):
+        category = bubble.get("category")
+        category_title = category["title"] if category and "title" in category else None
+        bubble_info = {"id": bubble["id"], "title": bubble["title"]}
+        if category_title:
+            categorizedgroups.setdefault(category_title, []).append(bubble_info)
+        else:
+            uncategorizedgroups.append(bubble_info)
+
+    for category in categorizedgroups:
+        categorizedgroups[category].sort(key=lambda x: x["title"])
+    categorizedgroups = dict(sorted(categorizedgroups.items()))
+    uncategorizedgroups.sort(key=lambda x: x["title"])
+
+    # Identify unread bubbles
+    bubble_id_to_title = {bubble["id"]: bubble["title"] for bubble in bubbles}
+    unread_bubbles = [
+        {
+            "bubble_id": stat["bubble_id"],
+            "title": bubble_id_to_title.get(stat["bubble_id"]),
+            "unread": stat.get("unread", 0),
+            "unread_mentions": stat.get("unread_mentions", 0)
+        }
+        for stat in stats
+        if stat.get("marked_unread", 0) > 0 or stat.get("unread", 0) > 0 or stat.get("unread_mentions", 0) > 0
+        if bubble_id_to_title.get(stat["bubble_id"])
+    ]
+
+    return {
+        "dms": sorted_dm_bubbles,
+        "categorized": categorizedgroups,
+        "uncategorized": uncategorizedgroups,
+        "unread": unread_bubbles,
+        "categories": list(categorizedgroups.keys()),
+        "bubble_ids": [bubble["id"] for bubble in bubbles if "id" in bubble],
+        "channelcodes": {bubble["id"]: bubble["channelcode"] for bubble in bubbles if "channelcode" in bubble},
+        # Compact per-bubble state that diff_overview compares
+        "index": {
+            bubble["id"]: {
+                "id": bubble["id"],
+                "title": bubble["title"],
+                "category": (bubble.get("category") or {}).get("title"),
+                "isdm": bool(bubble.get("isdm")),
+            }
+            for bubble in bubbles
+        },
+        "stats": {
+            stat["bubble_id"]: {
+                "unread": stat.get("unread", 0),
+                "unread_mentions": stat.get("unread_mentions", 0),
+                "marked_unread": stat.get("marked_unread", 0),
+            }
+            for stat in stats
+        },
+    }
+
+EMPTY_OVERVIEW = {"dms": None, "categorized": None, "uncategorized": None, "unread": None, "categories": None, "bubble_ids": [], "channelcodes": {}, "index": {}, "stats": {}}
+NO_UNREAD = {"unread": 0, "unread_mentions": 0, "marked_unread": 0}
+
+def diff_overview(old, new):
+    """
+    Change set between two parsed overviews: bubbles added, removed, or updated
+    (renamed or moved to another category), plus unread counts that changed.
+    """
+    old_index, new_index = old["index"], new["index"]
+    changes = {
+        "added": [bubble for bubble_id, bubble in new_index.items() if bubble_id not in old_index],
+        "removed": [bubble_id for bubble_id in old_index if bubble_id not in new_index],
+        "updated": [
+            dict(bubble, old_title=old_index[bubble_id]["title"])
+            for bubble_id, bubble in new_index.items()
+            if bubble_id in old_index and bubble != old_index[bubble_id]
+        ],
+        "unread": [],
+    }
+    old_stats, new_stats = old["stats"], new["stats"]
+    for bubble_id in new_index:
+        stat = new_stats.get(bubble_id, NO_UNREAD)
+        if stat != old_stats.get(bubble_id, NO_UNREAD):
+            changes["unread"].append(dict(stat, bubble_id=bubble_id, title=new_index[bubble_id]["title"]))
+    return changes
+
+def _digest(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+class BubbleOverview:
+    """
+    Parsed bubbleOverview.json, rebuilt only when the file's mtime or size changes.
+    Views are shared between callers and must be treated as read-only.
+    The lock covers both reloads and save(), so readers never parse a half-written file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._signature = None
+        self._views = EMPTY_OVERVIEW
+        self._snapshot = None
+        self._digest = None
+        self.loads = 0
+        self.writes = 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def views(self):
+        """Current views, reparsing the file first if it changed on disk."""
+        signature = self._stat()
+        if signature == self._signature:
+            return self._views
+        with self._lock:
+            signature = self._stat()
+            if signature != self._signature:
+                self._views = self._load()
+                self._snapshot = None
+                self._signature = signature
+            return self._views
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except json.JSONDecodeError:
+            print(f"Error reading JSON file: {self.path} is empty or invalid")
+            return EMPTY_OVERVIEW
+        except Exception as e:
+            print(f"Error reading JSON file: {e}")
+            return EMPTY_OVERVIEW
+        if not data or "bubbles" not in data or "stats" not in data:
+            print("Invalid JSON structure or empty file.")
+            return EMPTY_OVERVIEW
+        self.loads += 1
+        self._digest = _digest(data)
+        return parse_overview(data)
+
+    def refresh(self, data):
+        """
+        Install a fresh bubble.list response. The file is only rewritten (atomically)
+        when the response differs from what is stored. Returns the change set, or
+        None when nothing changed or the response is unusable.
+        """
+        if not data or "bubbles" not in data or "stats" not in data:
+            print("Invalid bubble list response; keeping the previous overview.")
+            return None
+        digest = _digest(data)
+        with self._lock:
+            old = self.views()
+            if digest == self._digest:
+                return None
+            previous_etag = self.snapshot()[0] if old is not EMPTY_OVERVIEW else None
+            views = parse_overview(data)
+            atomic_write_json(self.path, data)
+            self._views, self._digest, self._snapshot = views, digest, None
+            self._signature = self._stat()
+            self.loads += 1
+            self.writes += 1
+            changes = diff_overview(old, views)
+            changes["previous_etag"] = previous_etag
+            changes["etag"] = self.snapshot()[0]
+            return changes
+
+    def get(self, view):
+        return self.views()[view]
+
+    def snapshot(self):
+        """
+        (etag, body) for the combined sidebar payload. The body is serialized once
+        per overview change and the ETag is a hash of it, so it survives restarts.
+        """
+        views = self.views()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] is not views:
+            body = json.dumps({
+                "dms": views["dms"] or [],
+                "categorized": views["categorized"] or {},
+                "uncategorized": views["uncategorized"] or [],
+                "unread": views["unread"] or [],
+                "categories": views["categories"] or [],
+            }, separators=(",", ":")).encode("utf-8")
+            snapshot = self._snapshot = (views, hashlib.sha1(body).hexdigest(), body)
+        return snapshot[1], snapshot[2]
+
+_overviews = {}
+_overviews_lock = threading.Lock()
+
+def get_overview(path):
+    """The shared BubbleOverview for a file path."""
+    with _overviews_lock:
+        overview = _overviews.get(path)
+        if overview is None:
+            overview = _overviews[path] = BubbleOverview(path)
+        return overview
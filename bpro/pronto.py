@@ -2,12 +2,79 @@
 #Email: paul257@ohs.stanford.edu
 #URL: https://github.com/r0adki110/pronto-selfbots
 
-import requests, logging
+import requests, logging, time
+from requests.adapters import HTTPAdapter
+from functools import lru_cache
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from dataclasses import dataclass, asdict
+from .endpoints import ENDPOINTS, API_BASE_URL, Request
+from .middleware import RequestMetrics, RetryPolicy, RateLimiter, SingleFlight, ResponseCache
+
+# (connect, read) timeouts in seconds, so a stalled server can't hang a worker thread forever
+DEFAULT_TIMEOUT = (5, 30)
+# Keep-alive connections kept open per host
+DEFAULT_POOL_SIZE = 10
+# Number of per-host pools to cache (stanfordohs, accounts, files)
+DEFAULT_POOL_HOSTS = 4
+
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 class BackendError(Exception):
-    pass
+    def __init__(self, message, status_code=None, retry_after=None, transient=False):
+        super().__init__(message)
+        self.status_code = status_code  # None when no HTTP response was received
+        self.retry_after = retry_after  # seconds, from the Retry-After header
+        self.transient = transient  # connection failure or timeout; worth retrying
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, pool_hosts=DEFAULT_POOL_HOSTS):
+    """
+    Create a requests session with a keep-alive connection pool per host.
+    Reusing it skips the TCP+TLS handshake on every call after the first.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@lru_cache(maxsize=8)
+def auth_headers(access_token):
+    """Request headers for a token, built once per token rather than per call. Do not mutate."""
+    if access_token is None:
+        return JSON_HEADERS
+    return {**JSON_HEADERS, "Authorization": f"Bearer {access_token}"}
+
+def build_request(name, access_token=None, **params):
+    """Look up an endpoint in the registry and build the Request middleware will see."""
+    endpoint = ENDPOINTS[name]
+    url, payload = endpoint.build_request(params)
+    return Request(endpoint, access_token if endpoint.auth else None, url, payload)
+
+def _wrap(layer_call, call_next):
+    def handler(request):
+        return layer_call(request, call_next)
+    return handler
+
+def build_handler(send, middleware, attr="__call__"):
+    """Wrap `send` in the middleware chain, first layer outermost."""
+    handler = send
+    for layer in reversed(middleware):
+        handler = _wrap(getattr(layer, attr), handler)
+    return handler
 
 # Dataclass for device information
 @dataclass
@@ -17,64 +84,29 @@ class DeviceInfo:
     osname: str
     type: str
 
-class Pronto:
-    API_BASE_URL = "https://stanfordohs.pronto.io/"
-    # Configure logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
-    def __init__(self):
-        pass
-
+class ProntoEndpoints:
+    """
+    Endpoint methods shared by Pronto and AsyncPronto, so the two clients cannot
+    drift apart. Each one builds its call with self._call: Pronto's runs it and
+    returns the result, AsyncPronto's returns an awaitable.
+    """
     # AUTHENTICATION FUNCTIONS
     # Function to verify user email
     def requestVerificationEmail(self, email):
-        url = "https://accounts.pronto.io/api/v1/user.verify"
-        payload = {"email": email}
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            raise BackendError(f"HTTP error occurred: {http_err}")
-        except Exception as err:
-            raise BackendError(f"An error occurred: {err}")
+        return self._call("user.verify", email=email)
 
     # Function to log in using email and verification code
     def verification_code_to_login_token(self, email, verification_code):
-        url = "https://accounts.pronto.io/api/v3/user.login"
         device_info = DeviceInfo(
             browsername="Firefox",
             browserversion="130.0.0",
             osname="Windows",
             type="WEB"
         )
-        request_payload = {
-            "email": email,
-            "code": verification_code,
-            "device": asdict(device_info)
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        self.logger.info(f"Payload being sent: {request_payload}")
-        try:
-            response = requests.post(url, json=request_payload, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("user.login", email=email, code=verification_code, device=asdict(device_info))
 
     # Function to get user accesstoken from logintoken
     def login_token_to_access_token(self, logintoken):
-        url = f"{self.API_BASE_URL}api/v1/user.tokenlogin"
         device_info = {
             "browsername": "firefox",
             "browserversion": "130.0.0",
@@ -84,295 +116,50 @@ class Pronto:
             "osversion": "10.15.6",
             "appversion": "1.0.0",
         }
-        request_payload = {
-            "logintokens": [logintoken],
-            "device": device_info,
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        try:
-            response = requests.post(url, json=request_payload, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("user.tokenlogin", logintokens=[logintoken], device=device_info)
+
+    # Function to authorize a private Pusher channel for a websocket connection
+    def pusherAuth(self, access_token, socket_id, channel_name):
+        return self._call("pusher.auth", access_token, socket_id=socket_id, channel_name=channel_name)
 
     # BUBBLE FUNCTIONS
     # Function to get all user's bubbles
     def getUsersBubbles(self, access_token):
-        url = f"{self.API_BASE_URL}api/v3/bubble.list"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",  # Ensure 'Bearer' is included
-        }
-        try:
-            response = requests.post(url, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.list", access_token)
 
-    # Function to get last 50 messages in a bubble, given bubble ID 
+    # Function to get last 50 messages in a bubble, given bubble ID
     # and an optional argument of latest message ID, which will return a list of 50 messages sent before that message
     def get_bubble_messages(self, access_token, bubbleID, latestMessageID=None):
-        url = f"{self.API_BASE_URL}api/v1/bubble.history"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {"bubble_id": bubbleID}
-        if latestMessageID is not None:
-            request_payload["latest"] = latestMessageID
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.history", access_token, bubble_id=bubbleID, latest=latestMessageID)
 
     # Function to get information about a bubble
     def get_bubble_info(self, access_token, bubbleID):
-        url = f"{self.API_BASE_URL}api/v2/bubble.info"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "bubble_id": bubbleID,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.info", access_token, bubble_id=bubbleID)
 
     # Function to mark a bubble as read
     def markBubble(self, access_token, bubbleID, message_id=None):
-        url = f"{self.API_BASE_URL}api/v1/bubble.mark"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "bubble_id": bubbleID,
-            "message_id": message_id
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.mark", access_token, bubble_id=bubbleID, message_id=message_id)
 
     def membershipUpdate(self, access_token, bubbleID, marked_unread=False):
-        url = f"{self.API_BASE_URL}api/v1/membership.update"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "bubble_id": bubbleID,
-            "marked_unread": marked_unread,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("membership.update", access_token, bubble_id=bubbleID, marked_unread=marked_unread)
 
     # Function to create DM
     def createDM(self, access_token, id, orgID):
-        url = f"{self.API_BASE_URL}api/v1/dm.create"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "organization_id": orgID,
-            "user_id": id,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("dm.create", access_token, organization_id=orgID, user_id=id)
 
     # Function to create a bubble/group
     def createBubble(self, access_token, orgID, title, category_id):
-        url = f"{self.API_BASE_URL}api/v1/bubble.create"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        if category_id is not None:
-            request_payload = {
-                "organization_id": orgID,
-                "title": title,
-                "category_id": category_id,
-            }
-        else:
-            request_payload = {
-                "organization_id": orgID,
-                "title": title,
-            }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.create", access_token, organization_id=orgID, title=title, category_id=category_id)
 
     # Function to add a member to a bubble
     # invitations is a list of user IDs, in the form of [{user_id: 5302519}, {user_id: 5302367}]
     def addMemberToBubble(self, access_token, bubbleID, invitations, sendemails, sendsms):
-        url = f"{self.API_BASE_URL}api/v1/bubble.invite"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "bubbleID": bubbleID,
-            "invitations": invitations,
-            "sendemails": sendemails,
-            "sendsms": sendsms,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.invite", access_token, bubbleID=bubbleID, invitations=invitations, sendemails=sendemails, sendsms=sendsms)
 
     # Function to kick user from a bubble
     # users is a list of user IDs, in the form of [5302519]
     def kickUserFromBubble(self, access_token, bubbleID, users):
-        url = f"{self.API_BASE_URL}api/v1/bubble.kick"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "bubble_id": bubbleID,
-            users: users,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.kick", access_token, bubble_id=bubbleID, users=users)
 
     # Function to update a bubble
     # title is the new title of the bubble, in the form of a string
@@ -390,88 +177,29 @@ class Pronto:
     # create_announcement = allow "owner" or "member" to create an announcement in the bubble
 
     def updateBubble(self, access_token, bubbleID, title=None, category_id=None, changetitle=None, addmember=None, leavegroup=None, create_message=None, assign_task=None, pin_message=None, changecategory=None, removemember=None, create_videosession=None, videosessionrecordcloud=None, create_announcement=None):
-        url = f"{self.API_BASE_URL}api/v1/bubble.update"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "bubble_id": bubbleID,
-        }
-        if title is not None:
-            request_payload["title"] = title
-        if category_id is not None:
-            request_payload["category_id"] = category_id
-        if changetitle is not None:
-            request_payload["changetitle"] = changetitle
-        if addmember is not None:
-            request_payload["addmember"] = addmember
-        if leavegroup is not None:
-            request_payload["leavegroup"] = leavegroup
-        if create_message is not None:
-            request_payload["create_message"] = create_message
-        if assign_task is not None:
-            request_payload["assign_task"] = assign_task
-        if pin_message is not None:
-            request_payload["pin_message"] = pin_message
-        if changecategory is not None:
-            request_payload["changecategory"] = changecategory
-        if removemember is not None:
-            request_payload["removemember"] = removemember
-        if create_videosession is not None:
-            request_payload["create_videosession"] = create_videosession
-        if videosessionrecordcloud is not None:
-            request_payload["videosessionrecordcloud"] = videosessionrecordcloud
-        if create_announcement is not None:
-            request_payload["create_announcement"] = create_announcement
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call(
+            "bubble.update", access_token,
+            bubble_id=bubbleID,
+            title=title,
+            category_id=category_id,
+            changetitle=changetitle,
+            addmember=addmember,
+            leavegroup=leavegroup,
+            create_message=create_message,
+            assign_task=assign_task,
+            pin_message=pin_message,
+            changecategory=changecategory,
+            removemember=removemember,
+            create_videosession=create_videosession,
+            videosessionrecordcloud=videosessionrecordcloud,
+            create_announcement=create_announcement,
+        )
 
     # Function to pin message to bubble
     # Example {bubble_id: 3955365, pinned_message_id: 96930584, pinned_message_expires_at: "2025-01-18 23:12:18"}
     # or send pinned_messageid: "null" to unpin the message
     def pinMessage(self, access_token, pinned_message_id, pinned_message_expires_at):
-        url = f"{self.API_BASE_URL}api/v1/bubble.update"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "pinned_message_id": pinned_message_id,
-            "pinned_message_expires_at": pinned_message_expires_at,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.pin", access_token, pinned_message_id=pinned_message_id, pinned_message_expires_at=pinned_message_expires_at)
 
     # Function to create invite link
     # access is the access level of the invite, expiration is the expiration date of the invite
@@ -480,350 +208,123 @@ class Pronto:
     # expiration example: expires: "2024-12-09T16:08:34.332Z"
 
     def createInvite(self, bubbleID, access, expires, access_token):
-        url = f"{self.API_BASE_URL}api/clients/groups/{bubbleID}/invites"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "access": access,
-            "expires": expires,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("bubble.invitelink", access_token, bubble_id=bubbleID, access=access, expires=expires)
 
     # MESSAGE FUNCTIONS
     # Function to send a message to a bubble
     def send_message_to_bubble(self, access_token, bubbleID, created_at, message, userID, uuid, parentmessage_id):
-        url = f"{self.API_BASE_URL}api/v1/message.create"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        if parentmessage_id is None:
-            request_payload = {
-                "bubble_id": bubbleID,
-                "created_at": created_at,
-                "id": "Null",
-                "message": message,
-                "messagemedia": [],
-                "user_id": userID,
-                "uuid": uuid  
-            }
-        else:
-            request_payload = {
-                "bubble_id": bubbleID,
-                "created_at": created_at,
-                "id": "Null",
-                "message": message,
-                "messagemedia": [],
-                "parentmessage_id": parentmessage_id,
-                "user_id": userID,
-                "uuid": uuid  
-            }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call(
+            "message.create", access_token,
+            bubble_id=bubbleID,
+            created_at=created_at,
+            message=message,
+            user_id=userID,
+            uuid=uuid,
+            parentmessage_id=parentmessage_id,
+        )
 
     # Function to add a reaction to a message
     def addReaction(self, access_token, messageID, reactiontype_id):
-        url = f"{self.API_BASE_URL}api/v1/message.addreaction"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "message_id": messageID,
-            "reactiontype_id": reactiontype_id,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("message.addreaction", access_token, message_id=messageID, reactiontype_id=reactiontype_id)
 
     # Function to remove a reaction from a message
     def removeReaction(self, access_token, messageID, reactiontype_id):
-        url = f"{self.API_BASE_URL}api/v1/message.removereaction"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "message_id": messageID,
-            "reactiontype_id": reactiontype_id,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("message.removereaction", access_token, message_id=messageID, reactiontype_id=reactiontype_id)
 
     # Function to edit a message
     def editMessgae(self, access_token, newMessage, messageID):
-        url = f"{self.API_BASE_URL}api/v1/message.edit"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "message": newMessage,
-            "message_id": messageID,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("message.edit", access_token, message=newMessage, message_id=messageID)
 
     # Function to delete a message
     def deleteMessage(self, access_token, messageID):
-        url = f"{self.API_BASE_URL}api/v1/message.delete"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "message_id": messageID,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("message.delete", access_token, message_id=messageID)
 
     # USER INFO FUNCTIONS
     # Function to get user information
     def userInfo(self, access_token, id):
-        url = f"{self.API_BASE_URL}api/v1/user.info"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "id": id,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("user.info", access_token, id=id)
 
     # Function to get a user's mutual groups
     def mutualGroups(self, access_token, id):
-        url = f"{self.API_BASE_URL}api/v1/user.mutualgroups"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "id": id,
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("user.mutualgroups", access_token, id=id)
 
     # Function to set online/offline status
     def setStatus(self, access_token, userID, isonline, lastpresencetime):
-        url = f"{self.API_BASE_URL}api/clients/users/presence"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {  
-            "data": [
-                {
-                    "user_id": userID,
-                    "isonline": isonline,
-                    "lastpresencetime": lastpresencetime
-                }
-            ]
-        }
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("user.presence", access_token, data=[
+            {
+                "user_id": userID,
+                "isonline": isonline,
+                "lastpresencetime": lastpresencetime
+            }
+        ])
 
     # OTHER Functions
     # Search for message function
     # EXAMPLE: {search_type: "files", size: 25, from: 0, orderby: "newest", query: "hello there", user_ids: [5302419]}
     def searchMessage(self, access_token, query, bubbleID=None, orderby=None, user_ids=None):
-        url = f"{self.API_BASE_URL}api/v1/message.search"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "search_type": "messages",
-            "size": 25,
-            "from": 0,
-            "query": query,
-        }
-        if bubbleID is not None:
-            request_payload["bubble_id"] = bubbleID
-        if orderby is not None:
-            request_payload["orderby"] = orderby
-        if user_ids is not None:
-            request_payload["user_ids"] = user_ids
-        try:
-            response = requests.post(url, headers=headers, json=request_payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-        except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
-            raise BackendError(f"Request exception occurred: {req_err}")
-        except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
+        return self._call("message.search", access_token, query=query, bubble_id=bubbleID, orderby=orderby, user_ids=user_ids)
 
     # {"orderby":["firstname","lastname"],"includeself":true,"bubble_id":"3640189","page":1}
     def bubbleMembershipSearch(self, access_token, bubble_id, orderby=["firstname", "lastname"], includeself=True, page=None):
-        url = f"{self.API_BASE_URL}/api/v1/bubble.membershipsearch"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}",
-        }
-        request_payload = {
-            "orderby": orderby,
-            "includeself": includeself,
-            "bubble_id": bubble_id,
-        }
-        if page is not None:
-            request_payload["page"] = page
+        return self._call("bubble.membershipsearch", access_token, orderby=orderby, includeself=includeself, bubble_id=bubble_id, page=page)
+
+class Pronto(ProntoEndpoints):
+    API_BASE_URL = API_BASE_URL
+    # Configure logging
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, session=None, middleware=None):
+        # Shared pooled transport; pass `session` to reuse an existing pool
+        self.session = session or create_session(pool_size)
+        self.timeout = timeout
+        self.cache = ResponseCache()
+        self.single_flight = SingleFlight()
+        self.metrics = RequestMetrics()
+        self.retry = RetryPolicy()
+        self.rate_limiter = RateLimiter()
+        # Cache hits and coalesced followers never reach the upstream counters;
+        # retries sit outside the limiter so every attempt waits for a token
+        self.middleware = [self.cache, self.single_flight, self.metrics, self.retry, self.rate_limiter] if middleware is None else list(middleware)
+        self._handler = build_handler(self._send, self.middleware)
+
+    def add_middleware(self, layer):
+        """Append a middleware layer; it runs inside the ones already installed."""
+        self.middleware.append(layer)
+        self._handler = build_handler(self._send, self.middleware)
+
+    def stats(self):
+        """Counters for tuning: per-endpoint latency, throttling and retries."""
+        return {
+            "endpoints": self.metrics.snapshot(),
+            "rate_limiter": self.rate_limiter.snapshot(),
+            "retry": self.retry.snapshot(),
+            "single_flight": self.single_flight.snapshot(),
+            "cache": self.cache.snapshot(),
+        }
+
+    # REQUEST PIPELINE
+    # Every endpoint method goes through _call -> middleware -> _send
+    def _call(self, name, access_token=None, **params):
+        return self._handler(build_request(name, access_token, **params))
+
+    def _send(self, request):
+        response = None
         try:
-            response = requests.post(url, headers=headers, json=request_payload)
+            response = self.session.post(request.url, headers=auth_headers(request.access_token), json=request.payload, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as http_err:
-            self.logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-            if response.status_code == 401:
-                raise BackendError(f"HTTP error occurred: {http_err}")
-            else:
-                raise BackendError(f"HTTP error occurred: {http_err}")
+            self.logger.error("HTTP error occurred on %s: %s", request.endpoint.name, http_err)
+            self.logger.debug("Response body: %.500s", response.text)
+            raise BackendError(f"HTTP error occurred: {http_err}", response.status_code,
+                               parse_retry_after(response.headers.get("Retry-After")))
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as req_err:
+            self.logger.error("Request exception occurred on %s: %s", request.endpoint.name, req_err)
+            raise BackendError(f"Request exception occurred: {req_err}", transient=True)
         except requests.exceptions.RequestException as req_err:
-            self.logger.error(f"Request exception occurred: {req_err}")
+            self.logger.error("Request exception occurred on %s: %s", request.endpoint.name, req_err)
             raise BackendError(f"Request exception occurred: {req_err}")
         except Exception as err:
-            self.logger.error(f"An unexpected error occurred: {err}")
-            raise BackendError(f"An unexpected error occurred: {err}")
\ No newline at end of file
+            self.logger.error("An unexpected error occurred on %s: %s", request.endpoint.name, err)
+            raise BackendError(f"An unexpected error occurred: {err}")
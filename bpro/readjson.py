@@ -6,68 +6,70 @@ import json
 import os
 import datetime
 from .systemcheck import createappfolders  # updated relative import
+from .overview import get_overview
+from .atomicfile import atomic_write_json
 
 class ReadJSON:
     auth_path, chats_path, bubbles_path, loginTokenJSONPath, authTokenJSONPath, verificationCodeResponseJSONPath, settings_path, encryption_path, logs_path, settingsJSONPath, keysJSONPath, bubbleOverviewJSONPath, users_path = createappfolders(debug=True)
 
     @staticmethod
-    def create_bubble_folders(bubbleOverviewJSONPath, bubbles_path, sanitize_folder_name):
-        bubbles = ReadJSON.getdetailedbubbleoverview(bubbleOverviewJSONPath)
-        # Create folders for each category and bubble ID
-        if bubbles:
-            sorted_dm_bubbles, categorizedgroups, uncategorizedgroups, _ = bubbles
-            
-            # Create folders for categorized bubbles
-            for category, bubble_list in categorizedgroups.items():
-                category_folder_path = os.path.join(bubbles_path, sanitize_folder_name(category))
-                if not os.path.exists(category_folder_path):
-                    os.makedirs(category_folder_path, exist_ok=True)
-                    print(f"Folder created for category {category}: {category_folder_path}")
-                
-                for bubble in bubble_list:
-                    bubble_id = bubble["id"]
-                    bubble_folder_name = sanitize_folder_name(f"{bubble_id}")
-                    bubble_folder_path = os.path.join(category_folder_path, bubble_folder_name)
-                    if not os.path.exists(bubble_folder_path):
-                        os.makedirs(bubble_folder_path, exist_ok=True)
-                        print(f"Folder created for bubble {bubble_id} in category {category}: {bubble_folder_path}")
-            
-            # Create folders for uncategorized bubbles
-            uncategorized_folder_path = os.path.join(bubbles_path, sanitize_folder_name("Uncategorized"))
-            if not os.path.exists(uncategorized_folder_path):
-                os.makedirs(uncategorized_folder_path, exist_ok=True)
-                print(f"Folder created for Uncategorized bubbles: {uncategorized_folder_path}")
-            
-            for bubble in uncategorizedgroups:
-                bubble_id = bubble["id"]
-                bubble_folder_name = sanitize_folder_name(f"{bubble_id}")
-                bubble_folder_path = os.path.join(uncategorized_folder_path, bubble_folder_name)
-                if not os.path.exists(bubble_folder_path):
-                    os.makedirs(bubble_folder_path, exist_ok=True)
-                    print(f"Folder created for uncategorized bubble {bubble_id}: {bubble_folder_path}")
-            
-            # Create folders for DM bubbles
-            dm_folder_path = os.path.join(bubbles_path, sanitize_folder_name("DMs"))
-            if not os.path.exists(dm_folder_path):
-                os.makedirs(dm_folder_path, exist_ok=True)
-                print(f"Folder created for DM bubbles: {dm_folder_path}")
-            
-            for bubble in sorted_dm_bubbles:
-                bubble_id = bubble["id"]
-                bubble_folder_name = sanitize_folder_name(f"{bubble_id}")
-                bubble_folder_path = os.path.join(dm_folder_path, bubble_folder_name)
-                if not os.path.exists(bubble_folder_path):
-                    os.makedirs(bubble_folder_path, exist_ok=True)
-                    print(f"Folder created for DM bubble {bubble_id}: {bubble_folder_path}")
+    def create_bubble_folders(bubbleOverviewJSONPath, bubbles_path, sanitize_folder_name, locations=None):
+        """
+        Create bubbles/<category|Uncategorized|DMs>/<bubble_id> folders. With a
+        locations index (MessageStore), only bubbles whose folder is missing or whose
+        index entry is out of date are created, and the index is updated to match.
+        """
+        sorted_dm_bubbles, categorizedgroups, uncategorizedgroups, _ = ReadJSON.getdetailedbubbleoverview(bubbleOverviewJSONPath)
+        if sorted_dm_bubbles is None:
+            return
+
+        # Desired folder for every bubble, grouped the same way as the sidebar
+        groups = [(category, bubble_list) for category, bubble_list in categorizedgroups.items()]
+        groups += [("Uncategorized", uncategorizedgroups), ("DMs", sorted_dm_bubbles)]
+        wanted = {}
+        for group, bubble_list in groups:
+            group_folder_path = os.path.join(bubbles_path, sanitize_folder_name(group))
+            for bubble in bubble_list:
+                wanted[bubble["id"]] = (group, os.path.join(group_folder_path, sanitize_folder_name(f"{bubble['id']}")))
+
+        if locations is not None:
+            locations.rebuild_bubble_locations(bubbles_path)
+            indexed = locations.get_bubble_locations()
+        else:
+            indexed = {}
+
+        created = {}
+        for bubble_id, (group, bubble_folder_path) in wanted.items():
+            # One stat per bubble still catches folders deleted on disk since they were indexed
+            if indexed.get(bubble_id) == bubble_folder_path and os.path.isdir(bubble_folder_path):
+                continue
+            if not os.path.exists(bubble_folder_path):
+                os.makedirs(bubble_folder_path, exist_ok=True)
+                print(f"Folder created for bubble {bubble_id} in {group}: {bubble_folder_path}")
+            created[bubble_id] = bubble_folder_path
+
+        if locations is not None:
+            locations.set_bubble_locations(created)
 
     @staticmethod
     def save_response_to_file(response_data, file_path):
+        # Temp file + fsync + rename, so readers never see a half-written file
         try:
-            with open(file_path, "w") as file:
-                json.dump(response_data, file, indent=4)
+            atomic_write_json(file_path, response_data)
         except Exception as e:
             print(f"Error saving response to file: {e}")
 
+    @staticmethod
+    def get_settings(settingsJSONPath):
+        """settings.json as a dict; the file starts out empty, which reads as no settings."""
+        try:
+            with open(settingsJSONPath, "r") as file:
+                content = file.read()
+            return json.loads(content) if content.strip() else {}
+        except Exception as e:
+            print(f"Error reading settings: {e}")
+            return {}
+
     @staticmethod
     def getvalueLogin(file_path, value):
         try:
@@ -106,131 +108,22 @@ class ReadJSON:
 
     @staticmethod
     def getdetailedbubbleoverview(bubbleOverviewJSONPath):
-        try:
-            with open(bubbleOverviewJSONPath, "r") as file:
-                data = json.load(file)
-                if not data or "bubbles" not in data or "stats" not in data:
-                    print("Invalid JSON structure or empty file.")
-                    return None, None, None, None
-
-                bubbles = data["bubbles"]
-                stats = data["stats"]
-
-                # Separate and sort DM bubbles by name
-                sorted_dm_bubbles = sorted(
-                    [{"id": bubble["id"], "title": bubble["title"]} for bubble in bubbles if bubble.get("isdm")],
-                    key=lambda x: x["title"]
-                )
-
-                # Categorize and sort Non-DM bubbles
-                categorizedgroups = {}
-                uncategorizedgroups = []
-                unread_bubbles = []
-
-                for bubble in (b for b in bubbles if not b.get("isdm")):
-                    category = bubble.get("category")
-                    category_title = category["title"] if category and "title" in category else None
-                    bubble_info = {"id": bubble["id"], "title": bubble["title"]}
-                    if category_title:
-                        if category_title not in categorizedgroups:
-                            categorizedgroups[category_title] = []
-                        categorizedgroups[category_title].append(bubble_info)
-                    else:
-                        uncategorizedgroups.append(bubble_info)
-
-                # Sort bubbles within each category
-                for category in categorizedgroups:
-                    categorizedgroups[category].sort(key=lambda x: x["title"])
-                # Sort the categories themselves
-                categorizedgroups = dict(sorted(categorizedgroups.items()))
-
-                # Sort uncategorized groups
-                uncategorizedgroups.sort(key=lambda x: x["title"])
-
-                # Identify unread bubbles
-                bubble_id_to_title = {bubble["id"]: bubble["title"] for bubble in bubbles}
-                unread_bubbles = [
-                    {
-                        "title": bubble_id_to_title.get(stat["bubble_id"]),
-                        "unread": stat.get("unread", 0),
-                        "unread_mentions": stat.get("unread_mentions", 0)
-                    }
-                    for stat in stats
-                    if stat.get("marked_unread", 0) > 0 or stat.get("unread", 0) > 0 or stat.get("unread_mentions", 0) > 0
-                    if bubble_id_to_title.get(stat["bubble_id"])
-                ]
-
-                return sorted_dm_bubbles, categorizedgroups, uncategorizedgroups, unread_bubbles
-        except json.JSONDecodeError:
-            print(f"Error reading JSON file: {bubbleOverviewJSONPath} is empty or invalid")
-            return None, None, None, None
-        except Exception as e:
-            print(f"Error reading JSON file: {e}")
-            return None, None, None, None
+        return ReadJSON.getbubbleoverview(bubbleOverviewJSONPath)
 
     @staticmethod
     def getbubbleoverview(bubbleOverviewJSONPath):
-        try:
-            with open(bubbleOverviewJSONPath, "r") as file:
-                data = json.load(file)
-                if not data or "bubbles" not in data or "stats" not in data:
-                    print("Invalid JSON structure or empty file.")
-                    return None, None, None, None
-
-                bubbles = data["bubbles"]
-                stats = data["stats"]
-
-                # Separate and sort DM bubbles by name
-                sorted_dm_bubbles = sorted(
-                    [{"id": bubble["id"], "title": bubble["title"]} for bubble in bubbles if bubble.get("isdm")],
-                    key=lambda x: x["title"]
-                )
-
-                # Categorize and sort Non-DM bubbles
-                categorizedgroups = {}
-                uncategorizedgroups = []
-                unread_bubbles = []
-
-                for bubble in (b for b in bubbles if not b.get("isdm")):
-                    category = bubble.get("category")
-                    category_title = category["title"] if category and "title" in category else None
-                    bubble_info = {"id": bubble["id"], "title": bubble["title"]}
-                    if category_title:
-                        if category_title not in categorizedgroups:
-                            categorizedgroups[category_title] = []
-                        categorizedgroups[category_title].append(bubble_info)
-                    else:
-                        uncategorizedgroups.append(bubble_info)
-
-                # Sort bubbles within each category
-                for category in categorizedgroups:
-                    categorizedgroups[category].sort(key=lambda x: x["title"])
-                # Sort the categories themselves
-                categorizedgroups = dict(sorted(categorizedgroups.items()))
+        # Parsed once per change to the file; see bpro/overview.py
+        views = get_overview(bubbleOverviewJSONPath).views()
+        return views["dms"], views["categorized"], views["uncategorized"], views["unread"]
 
-                # Sort uncategorized groups
-                uncategorizedgroups.sort(key=lambda x: x["title"])
-
-                # Identify unread bubbles
-                bubble_id_to_title = {bubble["id"]: bubble["title"] for bubble in bubbles}
-                unread_bubbles = [
-                    {
-                        "title": bubble_id_to_title.get(stat["bubble_id"]),
-                        "unread": stat.get("unread", 0),
-                        "unread_mentions": stat.get("unread_mentions", 0)
-                    }
-                    for stat in stats
-                    if stat.get("marked_unread", 0) > 0 or stat.get("unread", 0) > 0 or stat.get("unread_mentions", 0) > 0
-                    if bubble_id_to_title.get(stat["bubble_id"])
-                ]
-
-                return sorted_dm_bubbles, categorizedgroups, uncategorizedgroups, unread_bubbles
-        except json.JSONDecodeError:
-            print(f"Error reading JSON file: {bubbleOverviewJSONPath} is empty or invalid")
-            return None, None, None, None
+    @staticmethod
+    def save_bubble_overview(response_data, bubbleOverviewJSONPath):
+        """Store a bubble.list response if it changed; returns the change set or None."""
+        try:
+            return get_overview(bubbleOverviewJSONPath).refresh(response_data)
         except Exception as e:
-            print(f"Error reading JSON file: {e}")
-            return None, None, None, None
+            print(f"Error saving response to file: {e}")
+            return None
 
     @staticmethod
     def get_dms(bubbleOverviewJSONPath):
@@ -283,11 +176,11 @@ class ReadJSON:
     @staticmethod
     def get_categories(bubbleOverviewJSONPath):
         try:
-            _, categorizedgroups, _, _ = ReadJSON.getbubbleoverview(bubbleOverviewJSONPath)
-            if categorizedgroups is None:
+            categories = get_overview(bubbleOverviewJSONPath).get("categories")
+            if categories is None:
                 print("No categories found.")
                 return []
-            return list(categorizedgroups.keys())
+            return categories
         except Exception as e:
             print(f"Error reading categories: {e}")
             return []
@@ -350,35 +243,34 @@ class ReadJSON:
     @staticmethod
     def get_channelcodes(bubbleOverviewJSONPath, bubble_id=None):
         try:
-            with open(bubbleOverviewJSONPath, "r") as file:
-                data = json.load(file)
-                if not data or "bubbles" not in data:
-                    print("Invalid JSON structure or empty file.")
-                    return {} if bubble_id is None else None
-
-                bubbles = data["bubbles"]
-
-                if bubble_id is None:
-                    # Return all channelcodes as a dictionary: {bubble_id: channelcode, ...}
-                    channelcodes = {}
-                    for bubble in bubbles:
-                        if "channelcode" in bubble:
-                            channelcodes[bubble["id"]] = bubble["channelcode"]
-                    return channelcodes
-                else:
-                    # Compare bubble IDs as strings
-                    for bubble in bubbles:
-                        if str(bubble.get("id")) == str(bubble_id) and "channelcode" in bubble:
-                            return bubble["channelcode"]
-                    print(f"No channelcode found for bubble id {bubble_id}.")
-                    return None
-        except json.JSONDecodeError:
-            print(f"Error reading JSON file: {bubbleOverviewJSONPath} is empty or invalid.")
-            return {} if bubble_id is None else None
+            channelcodes = get_overview(bubbleOverviewJSONPath).get("channelcodes")
+            if bubble_id is None:
+                # Return all channelcodes as a dictionary: {bubble_id: channelcode, ...}
+                return channelcodes
+            # Compare bubble IDs as strings
+            for key, channelcode in channelcodes.items():
+                if str(key) == str(bubble_id):
+                    return channelcode
+            print(f"No channelcode found for bubble id {bubble_id}.")
+            return None
         except Exception as e:
             print(f"Error reading channel codes from JSON file: {e}")
             return {} if bubble_id is None else None
 
+    @staticmethod
+    def get_sidebar_snapshot(bubbleOverviewJSONPath):
+        """(etag, JSON bytes) of every sidebar view, rebuilt only when the overview changes."""
+        return get_overview(bubbleOverviewJSONPath).snapshot()
+
+    @staticmethod
+    def get_bubble_ids(bubbleOverviewJSONPath):
+        """All bubble IDs in the overview, in the order Pronto lists them."""
+        try:
+            return get_overview(bubbleOverviewJSONPath).get("bubble_ids")
+        except Exception as e:
+            print(f"Error reading bubble IDs from JSON file: {e}")
+            return []
+
     @staticmethod
     def format_timestamp(ts_str, fmt='%I:%M %p'):
         """
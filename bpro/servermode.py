@@ -0,0 +1,135 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import functools, inspect, os
+
+# threading: Werkzeug dev server, one OS thread per connection (default, single user)
+# gevent: greenlet per connection, for many concurrent browser clients on one box
+SERVER_MODES = ("threading", "gevent")
+DEFAULT_SERVER_MODE = "threading"
+SERVER_MODE_ENV = "BPRO_SERVER_MODE"
+DEFAULT_MAX_CLIENTS = 1000      # gevent: concurrent HTTP + Socket.IO connections accepted
+DEFAULT_BLOCKING_THREADS = 32   # gevent: real OS threads for SQLite, export writes and other blocking work
+
+_mode = DEFAULT_SERVER_MODE
+_hub = None  # gevent: the main thread's hub, whose threadpool offload() uses
+
+def get_server_mode(argv=()):
+    """--server-mode=<mode> on the command line, else $BPRO_SERVER_MODE, else threading."""
+    mode = os.environ.get(SERVER_MODE_ENV, DEFAULT_SERVER_MODE)
+    for arg in argv:
+        if arg.startswith("--server-mode="):
+            mode = arg.split("=", 1)[1]
+    mode = mode.strip().lower()
+    if mode not in SERVER_MODES:
+        raise ValueError(f"Unknown server mode {mode!r}; expected one of {', '.join(SERVER_MODES)}")
+    return mode
+
+def patch(mode, blocking_threads=DEFAULT_BLOCKING_THREADS):
+    """
+    Prepare the process for a server mode. Must run before flask, requests or
+    sqlite3 are imported: gevent mode monkey-patches the standard library so
+    Pronto HTTP calls yield instead of holding a thread.
+    """
+    global _mode, _hub
+    if mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+        import gevent
+        _hub = gevent.get_hub()
+        _hub.threadpool.maxsize = blocking_threads
+    _mode = mode
+    return mode
+
+def server_mode():
+    return _mode
+
+def offload(func, *args, **kwargs):
+    """
+    Run a blocking call (SQLite, large JSON) without stalling other clients.
+    In gevent mode it runs on the hub's pool of real threads, which also keeps
+    MessageStore at one connection per pool thread; otherwise it is a plain call.
+    Called from a pool thread or another real thread, it also runs inline.
+    """
+    if _mode != "gevent":
+        return func(*args, **kwargs)
+    return _hub.threadpool.apply(func, args, kwargs)
+
+def _offloaded_iter(iterator):
+    done = object()
+    while True:
+        item = offload(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+class Offloaded:
+    """
+    Proxy that runs every method call on the wrapped object through offload(),
+    pulling generator results an item at a time, so callers on any greenlet
+    (request handlers, backfill, event dispatch, the message writer, exports)
+    never run SQLite on the hub.
+    """
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            result = offload(attr, *args, **kwargs)
+            return _offloaded_iter(result) if inspect.isgenerator(result) else result
+        return call
+
+def offloaded(target):
+    """target behind an Offloaded proxy in gevent mode; unchanged otherwise."""
+    return Offloaded(target) if _mode == "gevent" else target
+
+def run_kwargs(max_clients=DEFAULT_MAX_CLIENTS):
+    """Extra socketio.run() arguments that enforce the mode's connection limit."""
+    if _mode != "gevent":
+        return {}
+    from gevent.pool import Pool
+    return {"spawn": Pool(max_clients)}
+
+class NativeThread:
+    """
+    Minimal threading.Thread stand-in that always gets a real OS thread, even
+    when gevent has patched threading. Used for the asyncio Pusher loop, which
+    cannot share the gevent hub with request greenlets.
+    """
+    def __init__(self, target, name=None, daemon=True):
+        self.target = target
+        self.name = name
+        self.daemon = daemon
+        self._started = False
+        if _mode == "gevent":
+            from gevent.monkey import get_original
+            self._start_new_thread, allocate_lock = get_original("_thread", ["start_new_thread", "allocate_lock"])
+        else:
+            import _thread
+            self._start_new_thread, allocate_lock = _thread.start_new_thread, _thread.allocate_lock
+        self._running = allocate_lock()
+
+    def start(self):
+        self._running.acquire()
+        self._started = True
+        self._start_new_thread(self._run, ())
+
+    def _run(self):
+        try:
+            self.target()
+        finally:
+            self._running.release()
+
+    def is_alive(self):
+        return self._started and self._running.locked()
+
+    def join(self, timeout=None):
+        if not self._started:
+            return
+        if self._running.acquire(timeout=-1 if timeout is None else timeout):
+            self._running.release()
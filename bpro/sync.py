@@ -0,0 +1,207 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import threading
+from .messagestore import detail_message
+
+# bubble.history returns at most this many messages per call
+HISTORY_PAGE_SIZE = 50
+# Pages walked back per sync before leaving the rest of a gap to backfill
+MAX_DELTA_PAGES = 20
+
+# message.search returns at most this many results and cannot page past them
+SERVER_SEARCH_SIZE = 25
+
+# Pusher event name fragments for message changes, and how each is applied to the store
+MESSAGE_EVENTS = (
+    ("MessageAdded", "upsert"),
+    ("MessageCreated", "upsert"),
+    ("MessageUpdated", "upsert"),
+    ("MessageEdited", "upsert"),
+    ("MessageRemoved", "delete"),
+    ("MessageDeleted", "delete"),
+    ("Reaction", "reaction"),
+)
+
+def message_event_op(event_name):
+    for fragment, op in MESSAGE_EVENTS:
+        if fragment in event_name:
+            return op
+    return None
+
+def _event_message(data):
+    """The raw message object carried by a Pusher event, if it has one."""
+    message = data.get("message") if isinstance(data, dict) else None
+    if isinstance(message, dict) and message.get("id") is not None:
+        return message
+    if isinstance(data, dict) and data.get("id") is not None and "bubble_id" in data:
+        return data
+    return None
+
+class MessageSync:
+    """
+    Incremental bubble.history sync into a MessageStore.
+
+    bubble.history only pages backwards (`latest` returns messages older than it),
+    so a delta sync reads the newest page and walks back until it reaches the
+    stored high-water mark. Usually that is one request. Older history is
+    pulled on demand with backfill(), which walks back from the low-water mark.
+    """
+    def __init__(self, pronto, store):
+        self.pronto = pronto
+        self.store = store
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, bubble_id):
+        with self._locks_lock:
+            return self._locks.setdefault(str(bubble_id), threading.Lock())
+
+    def _fetch_page(self, access_token, bubble_id, latest=None):
+        response = self.pronto.get_bubble_messages(access_token, bubble_id, latest)
+        if response is None or "messages" not in response:
+            raise Exception("401 Unauthorized")
+        messages = [m for m in response["messages"] if isinstance(m, dict) and m.get("id") is not None]
+        self.store.upsert_messages(bubble_id, messages)
+        return messages
+
+    def sync_latest(self, access_token, bubble_id, max_pages=MAX_DELTA_PAGES):
+        """Fetch messages newer than the high-water mark. Returns {new, pages, complete}."""
+        with self._lock(bubble_id):
+            state = self.store.get_sync_state(bubble_id)
+            high_water, low_water, complete = state["high_water"], state["low_water"], state["complete"]
+            new, pages, latest = 0, 0, None
+            newest = oldest = None
+
+            while pages < max_pages:
+                messages = self._fetch_page(access_token, bubble_id, latest)
+                pages += 1
+                if not messages:
+                    if high_water is None:
+                        complete = True
+                    break
+                ids = [int(m["id"]) for m in messages]
+                newest = max(newest or 0, max(ids))
+                oldest = min(ids)
+                new += sum(1 for message_id in ids if high_water is None or message_id > high_water)
+
+                if len(messages) < HISTORY_PAGE_SIZE and (high_water is None or oldest > high_water):
+                    # Reached the first message of the bubble
+                    low_water, complete = oldest, True
+                    break
+                if high_water is None:
+                    # First sync: one page is the whole delta
+                    low_water = oldest
+                    break
+                if oldest <= high_water:
+                    # Overlaps stored history, so the range stays contiguous
+                    break
+                latest = oldest
+            else:
+                # Gave up before reaching stored history; backfill resumes from here
+                low_water, complete = oldest, False
+
+            if newest is not None:
+                high_water = max(high_water or 0, newest)
+            self.store.set_sync_state(bubble_id, high_water, low_water, complete)
+            return {"new": new, "pages": pages, "complete": complete}
+
+    def backfill(self, access_token, bubble_id, pages=1):
+        """Fetch up to `pages` pages older than the low-water mark. Returns {fetched, pages, complete}."""
+        state = self.store.get_sync_state(bubble_id)
+        if state["high_water"] is None:
+            self.sync_latest(access_token, bubble_id)
+        with self._lock(bubble_id):
+            state = self.store.get_sync_state(bubble_id)
+            high_water, low_water, complete = state["high_water"], state["low_water"], state["complete"]
+            fetched = done = 0
+            while done < pages and not complete and low_water is not None:
+                messages = self._fetch_page(access_token, bubble_id, low_water)
+                done += 1
+                fetched += len(messages)
+                if messages:
+                    low_water = min(low_water, min(int(m["id"]) for m in messages))
+                if len(messages) < HISTORY_PAGE_SIZE:
+                    complete = True
+                self.store.set_sync_state(bubble_id, high_water, low_water, complete)
+            return {"fetched": fetched, "pages": done, "complete": complete}
+
+    def apply_event(self, event_name, bubble_id, data):
+        """
+        Apply a message create/edit/delete/reaction event to the store. Returns a
+        single-message delta {op, bubble_id, message_id, message} in the shape
+        get_messages() returns, or None if the event is not about messages.
+        """
+        op = message_event_op(event_name)
+        if op is None:
+            return None
+        message = _event_message(data)
+        message_id = (message or {}).get("id") or (data or {}).get("message_id")
+        if message_id is None:
+            return None
+        bubble_id = (message or {}).get("bubble_id") or bubble_id
+
+        if op == "delete":
+            self.store.delete_message(message_id)
+            return {"op": "delete", "bubble_id": str(bubble_id), "message_id": int(message_id), "message": None}
+        if op == "reaction" and message is None:
+            # Reaction events may only carry the new summary
+            if "reactionsummary" not in (data or {}):
+                return None
+            detail = self.store.patch_message(message_id, reactions=data["reactionsummary"])
+        else:
+            detail = self.store.upsert_messages(bubble_id, [message])[0]
+        if detail is None:
+            return None
+        return {"op": "upsert", "bubble_id": str(bubble_id), "message_id": int(message_id), "message": detail}
+
+    def older_messages(self, access_token, bubble_id, before_id, limit=HISTORY_PAGE_SIZE):
+        """Messages older than before_id, backfilling a page first if the store runs short."""
+        messages = self.store.get_messages(bubble_id, limit=limit, before_id=before_id)
+        if len(messages) < limit and not self.store.get_sync_state(bubble_id)["complete"]:
+            self.backfill(access_token, bubble_id)
+            messages = self.store.get_messages(bubble_id, limit=limit, before_id=before_id)
+        return messages
+
+    @staticmethod
+    def _synced(state, message_id):
+        return state["low_water"] is not None and state["low_water"] <= message_id <= state["high_water"]
+
+    def search(self, access_token, query, bubble_id=None, author=None, limit=SERVER_SEARCH_SIZE, offset=0, bubble_ids=()):
+        """
+        Ranked local full-text search. message.search is only asked on the first
+        page, and only when part of the searched history has not been synced yet;
+        its hits that fall inside synced ranges are dropped as duplicates.
+        Returns {results, local, remote}.
+        """
+        local = self.store.search(query, bubble_id=bubble_id, author=author, limit=limit, offset=offset)
+        states = self.store.get_sync_states()
+        if local is None:
+            unsynced, local = True, []
+        elif bubble_id is not None:
+            unsynced = not states.get(int(bubble_id), {}).get("complete")
+        else:
+            unsynced = any(not states.get(int(b), {}).get("complete") for b in bubble_ids) or not states
+
+        remote = []
+        if unsynced and offset == 0 and len(local) < limit:
+            response = self.pronto.searchMessage(access_token, query, bubbleID=bubble_id) or {}
+            seen = {result["message_id"] for result in local}
+            for message in response.get("messages") or response.get("results") or []:
+                message_bubble = (message.get("bubble_id") or bubble_id) if isinstance(message, dict) else None
+                if message_bubble is None or message.get("id") is None:
+                    continue
+                message_id = int(message["id"])
+                state = states.get(int(message_bubble))
+                if message_id in seen or (state and self._synced(state, message_id)):
+                    continue
+                detail = detail_message(message)
+                if author and author.lower() not in (detail["author"] or "").lower():
+                    continue
+                detail["bubble_id"] = int(message_bubble)
+                detail["rank"] = None
+                remote.append(detail)
+                seen.add(message_id)
+        results = (local + remote)[:limit]
+        return {"results": results, "local": len(local), "remote": len(results) - len(local)}
@@ -10,6 +10,13 @@ import requests
 import time
 import logging
 
+if __package__:
+    from .pronto import create_session, DEFAULT_TIMEOUT
+else:  # run as a standalone script (python bpro/uploads.py); pronto needs the bpro package
+    import os, sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from bpro.pronto import create_session, DEFAULT_TIMEOUT
+
 
 class ProntoUploader:
     def __init__(
@@ -18,8 +25,13 @@ class ProntoUploader:
         bubble_id: int,
         base_url: str = "https://stanfordohs.pronto.io",
         log_level: int = logging.INFO,
+        session: requests.Session = None,
+        timeout: tuple = DEFAULT_TIMEOUT,
     ):
         self.base_url = base_url.rstrip("/")
+        # pass Pronto.session to share its connection pool
+        self.session = session or create_session()
+        self.timeout = timeout
         self.bubble_id = bubble_id
         self.headers = {
             "Authorization": f"Bearer {token}",
@@ -42,7 +54,7 @@ class ProntoUploader:
         headers = {**self.headers, "Content-Type": mime, "Content-Length": str(size)}
 
         with p.open("rb") as fh:
-            r = requests.put(url, params=params, data=fh, headers=headers)
+            r = self.session.put(url, params=params, data=fh, headers=headers, timeout=self.timeout)
         r.raise_for_status()
         data = r.json()["data"]
         self.log.info("Uploaded %s → key=%s", p.name, data["key"])
@@ -57,7 +69,7 @@ class ProntoUploader:
     ) -> None:
         url = f"{self.base_url}/api/clients/files/{orig_key}/normalized"
         for attempt in range(1, tries + 1):
-            r = requests.get(url, params={"preset": preset}, headers=self.headers)
+            r = self.session.get(url, params={"preset": preset}, headers=self.headers, timeout=self.timeout)
             r.raise_for_status()
             if "normalized" in r.json().get("data", {}):
                 self.log.info("✓ normalized (attempt %s)", attempt)
@@ -93,7 +105,7 @@ class ProntoUploader:
                     }
                 ],
             }
-            r = requests.post(url, json=payload, headers=self.headers)
+            r = self.session.post(url, json=payload, headers=self.headers, timeout=self.timeout)
 
             if r.status_code == 400 and "INVALID_ATTACHMENT_FILE_KEY" in r.text:
                 self.log.warning(
@@ -129,10 +141,11 @@ class ProntoUploader:
         self.wait_until_ready(orig_key, preset=preset)
 
         # 4. fetch normalized metadata
-        r = requests.get(
+        r = self.session.get(
             f"{self.base_url}/api/clients/files/{orig_key}/normalized",
             params={"preset": preset},
             headers=self.headers,
+            timeout=self.timeout,
         )
         r.raise_for_status()
         norm_data = r.json()["data"]["normalized"]
@@ -2,171 +2,481 @@
 #Email: paul257@ohs.stanford.edu
 #URL: https://github.com/r0adki110/Better-Pronto
 
-from .readjson import * 
-import json, asyncio, requests, websockets, threading
+from .readjson import *
+from .pronto import DEFAULT_TIMEOUT
+from .asyncpronto import AsyncPronto
+from .eventqueue import EventDispatcher, DEFAULT_WORKERS, DEFAULT_MAX_DEPTH
+from .servermode import NativeThread, server_mode
+import json, asyncio, websockets, threading, time
+from dataclasses import dataclass, field
 from typing import Dict, Optional, Callable
 import sys
 
+PUSHER_URI = "wss://ws-mt1.pusher.com/app/f44139496d9b75f37d27?protocol=7&client=js&version=8.3.0&flash=false"
+# Used until the server tells us its activity_timeout
+DEFAULT_ACTIVITY_TIMEOUT = 30
+MAX_RECONNECT_DELAY = 30
+# pusher.auth calls in flight at once when subscribing many channels; there is no
+# batch auth endpoint, so this (and the "pusher" rate-limit family) bounds startup
+DEFAULT_AUTH_CONCURRENCY = 16
+# How long the reader waits for room for a never-drop event before queueing it anyway
+BACKPRESSURE_POLL = 0.01
+MAX_BACKPRESSURE = 5.0
+# Bubbles opened in the UI are unsubscribed after this long without being viewed again
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+# Upper bound on channels subscribed at once, across watch_all() and opened bubbles
+DEFAULT_MAX_CHANNELS = 500
+
+@dataclass
+class Subscription:
+    """Handle for one watched bubble; task is its in-flight subscribe, if any."""
+    bubble_id: str
+    channel: str
+    pinned: bool = False  # watch_all() subscriptions are never idle-evicted
+    last_viewed: float = field(default_factory=time.monotonic)
+    task: Optional[asyncio.Task] = None
+
 class WebSocketClient:
-    def __init__(self, api_base_url, access_token, on_event_callback):
+    """
+    One Pusher connection, on one event loop in one thread, shared by every bubble.
+    Watching a bubble costs a pusher.auth call and a subscribe frame; on reconnect
+    every channel is subscribed again on the new socket.
+    """
+    def __init__(self, api_base_url, access_token, on_event_callback, timeout=DEFAULT_TIMEOUT, auth_concurrency=DEFAULT_AUTH_CONCURRENCY,
+                 dispatch_workers=DEFAULT_WORKERS, max_queue_depth=DEFAULT_MAX_DEPTH,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, max_channels=DEFAULT_MAX_CHANNELS, client=None):
         self.api_base_url = api_base_url.rstrip('/')
         self.access_token = access_token
+        self.timeout = timeout
         self.on_event_callback = on_event_callback  # function to call with parsed JSON events
-        self.active_connections = {}  # Store active connections by bubble_id
+        # Handlers run on dispatcher threads so a slow one never stalls the socket reader
+        self.dispatcher = EventDispatcher(self._handle_event, workers=dispatch_workers, max_depth=max_queue_depth)
+        self.channels = {}  # bubble_id -> channel name we want subscribed
+        self._subscriptions = {}  # bubble_id -> Subscription
+        self.idle_timeout = idle_timeout
+        self.max_channels = max_channels
+        self.evicted = 0
+        self.active_bubble = None  # bubble open in the UI (set_active_bubble)
+        self._viewing = set()  # bubbles open in any browser tab; never evicted
+        self.subscribed = set()  # channel names confirmed on the current socket
+        self._pending = set()  # channel names with a subscribe frame in flight
+        self._channel_bubbles = {}  # channel name -> bubble_id, for routing events
+        self.auth_concurrency = auth_concurrency
+        self._channel_stats = {}  # channel name -> subscription timings and failures
+        self._lock = threading.Lock()
         self.running = True
         self.loop = None
-        
+        self._thread = None
+        self._ws = None
+        self._socket_id = None
+        # AsyncPronto for pusher.auth; AsyncPronto.sharing(pronto) puts auth on the app's rate budget and stats
+        self.client = client
+        self._client = None
+
         # Read bubble metadata
         self.readjson = ReadJSON()
         auth_path, chats_path, bubbles_path, self.loginTokenJSONPath, self.authTokenJSONPath, \
         self.verificationCodeResponseJSONPath, settings_path, encryption_path, logs_path, \
         self.settingsJSONPath, self.keysJSONPath, self.bubbleOverviewJSONPath, users_path = createappfolders()
-        
+
         print(f"WebSocketClient initialized for API: {api_base_url}")
 
-    def _auth_payload(self, socket_id, bubble_id, channelcode):
+    @property
+    def active_connections(self):
+        """Bubbles currently being watched (kept for callers of the old per-bubble API)."""
+        with self._lock:
+            return dict(self.channels)
+
+    @staticmethod
+    def channel_name(bubble_id, channelcode):
+        return f"private-bubble.{bubble_id}.{channelcode}"
+
+    async def _auth_payload(self, client, socket_id, channel):
         return {
             "event": "pusher:subscribe",
             "data": {
-                "channel": f"private-bubble.{bubble_id}.{channelcode}",
-                "auth": self._get_auth(socket_id, bubble_id, channelcode)
+                "channel": channel,
+                "auth": await self._get_auth(client, socket_id, channel)
             }
         }
 
-    def _get_auth(self, socket_id, bubble_id, channelcode):
-        url = f"{self.api_base_url}/api/v1/pusher.auth"
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.access_token}"}
-        resp = requests.post(url, headers=headers, json={
-            "socket_id": socket_id, 
-            "channel_name": f"private-bubble.{bubble_id}.{channelcode}"
-        })
-        resp.raise_for_status()
-        return resp.json().get("auth", "")
-
-    async def _connect_to_bubble(self, bubble_id, channelcode):
-        """Connect to a specific bubble's websocket channel"""
-        uri = "wss://ws-mt1.pusher.com/app/f44139496d9b75f37d27?protocol=7&client=js&version=8.3.0&flash=false"
-        
+    async def _get_auth(self, client, socket_id, channel):
+        # Awaited on the connection's own loop instead of blocking it with requests
+        resp = await client.pusherAuth(self.access_token, socket_id, channel)
+        return resp.get("auth", "")
+
+    # CONNECTION LOOP
+    def start(self):
+        """Start the shared connection thread if it is not already running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.running = True
+            self.dispatcher.start()
+            self.loop = asyncio.new_event_loop()
+            # Under gevent the asyncio loop needs its own OS thread, not a greenlet
+            thread_class = NativeThread if server_mode() == "gevent" else threading.Thread
+            self._thread = thread_class(target=self._run_loop, name="pusher-websocket", daemon=True)
+            self._thread.start()
+
+    def _in_loop_thread(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._connection())
+        except Exception as e:
+            print(f"WebSocket connection thread error: {e}")
+        finally:
+            self.loop.close()
+
+    async def _connection(self):
         reconnect_attempts = 0
-        max_reconnect_attempts = 5
-        
-        while self.running and reconnect_attempts < max_reconnect_attempts:
-            try:
-                async with websockets.connect(uri, open_timeout=20) as ws:
-                    print(f"WebSocket connected to {uri} for bubble {bubble_id}")
-                    reconnect_attempts = 0  # Reset counter on successful connection
-                    
-                    # Handle connection initialization
-                    msg = await ws.recv()
-                    init = json.loads(msg)
-                    sid = json.loads(init.get("data","{}")).get("socket_id")
-                    await ws.send(json.dumps(self._auth_payload(sid, bubble_id, channelcode)))
-                    print(f"Subscribed to channel: private-bubble.{bubble_id}.{channelcode}")
-                    
-                    # Event handling loop
-                    while self.running:
+        self._client = self.client or AsyncPronto(timeout=self.timeout)
+        sweeper = asyncio.ensure_future(self._evict_idle())
+        try:
+            while self.running:
+                try:
+                    async with websockets.connect(PUSHER_URI, open_timeout=20) as ws:
+                        print(f"WebSocket connected to {PUSHER_URI}")
+                        reconnect_attempts = 0  # Reset counter on successful connection
+
+                        # Handle connection initialization
+                        init = json.loads(await ws.recv())
+                        init_data = json.loads(init.get("data", "{}"))
+                        activity_timeout = init_data.get("activity_timeout", DEFAULT_ACTIVITY_TIMEOUT)
+                        self._ws, self._socket_id = ws, init_data.get("socket_id")
+                        self.subscribed.clear()
+                        self._pending.clear()
+
+                        # Resubscribe everything we were watching before the (re)connect.
+                        # Runs alongside _receive so confirmations and pings are handled meanwhile
+                        resubscribe = asyncio.ensure_future(self._subscribe_many(self.active_connections.items()))
                         try:
-                            raw = await asyncio.wait_for(ws.recv(), timeout=30)  # Add timeout to detect stale connections
-                            if raw == "ping":
-                                await ws.send("pong")
-                            else:
-                                try:
-                                    event = json.loads(raw)
-                                    # Debug important events
-                                    event_type = event.get("event", "")
-                                    if "UserTyping" in event_type or "Stopped" in event_type:
-                                        print(f"Typing event: {event_type} for bubble {bubble_id}")
-                                    
-                                    # Add bubble_id to event data for routing
-                                    event["_bubble_id"] = bubble_id
-                                    
-                                    # Send event to handler callback
-                                    if self.on_event_callback:
-                                        self.on_event_callback(event)
-                                except json.JSONDecodeError:
-                                    pass
-                        except asyncio.TimeoutError:
-                            # Send heartbeat to keep connection alive
-                            await ws.send(json.dumps({"event": "pusher:ping"}))
-            except Exception as e:
-                if not self.running:
-                    print(f"WebSocket for bubble {bubble_id} shutting down")
-                    break
-                    
-                print(f"WebSocket connection error for bubble {bubble_id}: {e}")
-                reconnect_attempts += 1
-                wait_time = min(30, 2 ** reconnect_attempts)
-                print(f"Reconnecting in {wait_time} seconds... (attempt {reconnect_attempts})")
-                await asyncio.sleep(wait_time)
-        
-        if reconnect_attempts >= max_reconnect_attempts:
-            print(f"Max reconnection attempts reached for bubble {bubble_id}. Giving up.")
-        
-        # Remove from active connections when done
-        if bubble_id in self.active_connections:
-            del self.active_connections[bubble_id]
+                            await self._receive(ws, activity_timeout)
+                        finally:
+                            resubscribe.cancel()
+                except Exception as e:
+                    if not self.running:
+                        break
+                    reconnect_attempts += 1
+                    wait_time = min(MAX_RECONNECT_DELAY, 2 ** reconnect_attempts)
+                    print(f"WebSocket connection error: {e}")
+                    print(f"Reconnecting in {wait_time} seconds... (attempt {reconnect_attempts})")
+                    await asyncio.sleep(wait_time)
+                finally:
+                    self._ws = self._socket_id = None
+        finally:
+            sweeper.cancel()
+            await self._client.close()
+            print("WebSocket shutting down")
+
+    async def _receive(self, ws, activity_timeout):
+        while self.running:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=activity_timeout)  # Detect stale connections
+            except asyncio.TimeoutError:
+                # Send heartbeat to keep connection alive
+                await ws.send(json.dumps({"event": "pusher:ping", "data": {}}))
+                continue
+            try:
+                event = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+
+            event_type = event.get("event", "")
+            if event_type == "pusher:ping":
+                await ws.send(json.dumps({"event": "pusher:pong", "data": {}}))
+                continue
+            if event_type == "pusher_internal:subscription_succeeded":
+                channel = event.get("channel")
+                self._pending.discard(channel)
+                self.subscribed.add(channel)
+                stats = self._channel_stats.get(channel)
+                if stats and stats["requested_at"] is not None:
+                    stats["latency_ms"] = round((time.monotonic() - stats["requested_at"]) * 1000, 1)
+                    stats["requested_at"] = None
+                continue
+            if event_type == "pusher:subscription_error":
+                channel = event.get("channel")
+                self._pending.discard(channel)
+                self._record_failure(channel, event.get("data"))
+                print(f"Subscription to {channel} failed: {event.get('data')}")
+                continue
+            if event_type.startswith("pusher"):
+                if event_type == "pusher:error":
+                    print(f"Pusher error: {event.get('data')}")
+                continue
+
+            # Add bubble_id to event data for routing
+            bubble_id = self._channel_bubbles.get(event.get("channel"))
+            if bubble_id is None:
+                continue
+            event["_bubble_id"] = bubble_id
+            if "UserTyping" in event_type or "Stopped" in event_type:
+                print(f"Typing event: {event_type} for bubble {bubble_id}")
+
+            await self._enqueue(event)
+
+    async def _enqueue(self, event):
+        """Hand an event to the dispatcher, pausing the reader while its shard is full."""
+        waited = 0.0
+        while not self.dispatcher.offer(event, force=waited >= MAX_BACKPRESSURE):
+            await asyncio.sleep(BACKPRESSURE_POLL)
+            waited += BACKPRESSURE_POLL
+
+    def _handle_event(self, event):
+        # Send event to handler callback
+        if self.on_event_callback:
+            self.on_event_callback(event)
+
+    async def _subscribe(self, bubble_id, channel):
+        if self._ws is None or channel in self.subscribed or channel in self._pending:
+            return False  # Subscribed when the connection (re)opens
+        subscription = self._subscriptions.get(bubble_id)
+        if subscription is None or subscription.channel != channel:
+            return False  # Unsubscribed before we got here
+        subscription.task = asyncio.current_task()
+        self._pending.add(channel)
+        stats = self._channel_stats.setdefault(channel, {"bubble_id": bubble_id, "requested_at": None, "auth_ms": None, "latency_ms": None, "failures": 0, "last_error": None})
+        started = stats["requested_at"] = time.monotonic()
+        try:
+            payload = await self._auth_payload(self._client, self._socket_id, channel)
+            stats["auth_ms"] = round((time.monotonic() - started) * 1000, 1)
+            await self._ws.send(json.dumps(payload))
+            return True
+        except asyncio.CancelledError:
+            self._pending.discard(channel)
+            raise
+        except Exception as e:
+            self._pending.discard(channel)
+            self._record_failure(channel, e)
+            print(f"Failed to subscribe to bubble {bubble_id}: {e}")
+            return False
+        finally:
+            subscription.task = None
+
+    async def _subscribe_many(self, items):
+        """Subscribe (bubble_id, channel) pairs with at most auth_concurrency auth calls in flight."""
+        semaphore = asyncio.Semaphore(self.auth_concurrency)
+        started = time.monotonic()
+
+        async def subscribe(bubble_id, channel):
+            async with semaphore:
+                return await self._subscribe(bubble_id, channel)
+
+        sent = sum(await asyncio.gather(*(subscribe(bubble_id, channel) for bubble_id, channel in items)))
+        if sent:
+            print(f"Sent {sent} subscriptions in {time.monotonic() - started:.1f}s")
+
+    def _record_failure(self, channel, error):
+        stats = self._channel_stats.get(channel)
+        if stats is not None:
+            stats["failures"] += 1
+            stats["last_error"] = str(error)
+            stats["requested_at"] = None
+
+    async def _unsubscribe(self, channel):
+        was_sent = channel in self.subscribed or channel in self._pending
+        self.subscribed.discard(channel)
+        self._pending.discard(channel)
+        self._channel_stats.pop(channel, None)
+        if self._ws is not None and was_sent:
+            await self._ws.send(json.dumps({"event": "pusher:unsubscribe", "data": {"channel": channel}}))
+
+    async def _evict_idle(self):
+        """Periodically unsubscribe opened bubbles that have not been viewed within idle_timeout."""
+        while True:
+            await asyncio.sleep(min(60, self.idle_timeout / 2))
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._lock:
+                idle = [sub.bubble_id for sub in self._subscriptions.values() if self._evictable(sub) and sub.last_viewed < cutoff]
+            for bubble_id in idle:
+                print(f"Unsubscribing idle bubble {bubble_id}")
+                self.disconnect_from_bubble(bubble_id)
+                self.evicted += 1
 
+    def _evictable(self, subscription):
+        """Pinned and currently open bubbles are never evicted. Needs self._lock."""
+        return not subscription.pinned and subscription.bubble_id != self.active_bubble and subscription.bubble_id not in self._viewing
+
+    def touch(self, bubble_id):
+        """Record that a bubble is still being viewed, resetting its idle clock."""
+        with self._lock:
+            subscription = self._subscriptions.get(str(bubble_id))
+            if subscription is not None:
+                subscription.last_viewed = time.monotonic()
+
+    def set_active(self, bubble_id):
+        """Mark the bubble open in the UI; it stays subscribed however long it is open."""
+        with self._lock:
+            self.active_bubble = str(bubble_id) if bubble_id is not None else None
+        if bubble_id is not None:
+            self.touch(bubble_id)
+
+    def set_viewing(self, bubble_ids):
+        """Replace the set of bubbles open in browser tabs (one per Socket.IO client)."""
+        viewing = {str(bubble_id) for bubble_id in bubble_ids if bubble_id is not None}
+        with self._lock:
+            # Bubbles that stop being viewed start their idle timeout from now
+            now = time.monotonic()
+            for bubble_id in self._viewing ^ viewing:
+                subscription = self._subscriptions.get(bubble_id)
+                if subscription is not None:
+                    subscription.last_viewed = now
+            self._viewing = viewing
+
+    def _register(self, bubble_id, channel, pinned=False):
+        """
+        Add or refresh a subscription handle. Returns (subscription, is_new), or
+        (None, False) when the channel budget is spent on pinned subscriptions.
+        Must be called with self._lock held.
+        """
+        subscription = self._subscriptions.get(bubble_id)
+        if subscription is not None and subscription.channel == channel:
+            subscription.pinned = subscription.pinned or pinned
+            subscription.last_viewed = time.monotonic()
+            return subscription, False
+        if subscription is not None:
+            # The bubble's channel code changed: unsubscribe the old channel and stop routing it
+            pinned = subscription.pinned or pinned
+            self._drop(bubble_id)
+        elif len(self._subscriptions) >= self.max_channels:
+            # Over budget: make room by evicting the least recently viewed unpinned bubble
+            evictable = [sub for sub in self._subscriptions.values() if self._evictable(sub)]
+            if not evictable:
+                return None, False
+            victim = min(evictable, key=lambda sub: sub.last_viewed)
+            self._drop(victim.bubble_id)
+            self.evicted += 1
+        subscription = Subscription(bubble_id, channel, pinned)
+        self._subscriptions[bubble_id] = subscription
+        self.channels[bubble_id] = channel
+        self._channel_bubbles[channel] = bubble_id
+        return subscription, True
+
+    def _drop(self, bubble_id):
+        """Forget a subscription, cancel its in-flight subscribe and unsubscribe. Needs self._lock."""
+        subscription = self._subscriptions.pop(bubble_id, None)
+        if subscription is None:
+            return None
+        self.channels.pop(bubble_id, None)
+        self._channel_bubbles.pop(subscription.channel, None)
+        task = subscription.task
+        if task is not None and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(task.cancel)
+        self._submit(self._unsubscribe(subscription.channel))
+        return subscription
+
+    def _submit(self, coro):
+        """Run a coroutine on the connection loop from any thread."""
+        if self.loop is None or self.loop.is_closed():
+            coro.close()
+            return None
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # SUBSCRIPTIONS
     def connect_to_bubble(self, bubble_id):
-        """Start a connection to a bubble (or reuse existing)"""
+        """Watch a bubble's channel on the shared connection (no-op if already watched)"""
         if not bubble_id:
             print("Invalid bubble_id, cannot connect")
             return False
-            
-        if bubble_id in self.active_connections:
-            print(f"Already connected to bubble {bubble_id}")
-            return True
-            
+        bubble_id = str(bubble_id)
+
         # Get channel code for the bubble
         try:
             channelcode = self.readjson.get_channelcodes(self.bubbleOverviewJSONPath, bubble_id)
             if not channelcode:
                 print(f"No channel code found for bubble {bubble_id}")
                 return False
-                
-            print(f"Connecting to bubble {bubble_id} with channel code {channelcode}")
-            
-            # Always create a new event loop for the thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            self.loop = loop
-            
-            # Create a new thread to run the connection
-            def run_connection():
-                try:
-                    self.loop.run_until_complete(self._connect_to_bubble(bubble_id, channelcode))
-                except Exception as e:
-                    print(f"WebSocket connection thread error: {e}")
-                    
-            # Start the thread
-            thread = threading.Thread(target=run_connection)
-            thread.daemon = True
-            thread.start()
-            
-            # Store thread in active connections
-            self.active_connections[bubble_id] = thread
+
+            channel = self.channel_name(bubble_id, channelcode)
+            with self._lock:
+                subscription, is_new = self._register(bubble_id, channel)
+            if subscription is None:
+                print(f"Channel budget of {self.max_channels} reached; not subscribing to bubble {bubble_id}")
+                return False
+            if not is_new:
+                print(f"Already connected to bubble {bubble_id}")
+                return True
+
+            print(f"Subscribing to bubble {bubble_id} with channel code {channelcode}")
+            self.start()
+            self._submit(self._subscribe(bubble_id, channel))
             return True
-            
+
         except Exception as e:
             print(f"Error connecting to bubble {bubble_id}: {e}")
             import traceback
             print(traceback.format_exc())
             return False
-        
+
+    def watch_all(self):
+        """Subscribe to every bubble in the overview, authorizing channels concurrently"""
+        channelcodes = self.readjson.get_channelcodes(self.bubbleOverviewJSONPath)
+        if not channelcodes:
+            print("No channel codes found; nothing to watch")
+            return 0
+        items = []
+        with self._lock:
+            for bubble_id, channelcode in channelcodes.items():
+                bubble_id = str(bubble_id)
+                channel = self.channel_name(bubble_id, channelcode)
+                subscription, is_new = self._register(bubble_id, channel, pinned=True)
+                if subscription is None:
+                    print(f"Channel budget of {self.max_channels} reached; watching the first {len(self._subscriptions)} bubbles")
+                    break
+                if is_new:
+                    items.append((bubble_id, channel))
+        print(f"Watching {len(items)} more bubbles ({len(channelcodes)} total)")
+        self.start()
+        self._submit(self._subscribe_many(items))
+        return len(items)
+
+    def subscription_stats(self):
+        """Per-channel auth time, subscribe latency and failures, plus totals."""
+        channels = {channel: {k: v for k, v in stats.items() if k != "requested_at"} for channel, stats in list(self._channel_stats.items())}
+        latencies = sorted(stats["latency_ms"] for stats in channels.values() if stats["latency_ms"] is not None)
+        return {
+            "watched": len(self.channels),
+            "max_channels": self.max_channels,
+            "pinned": sum(1 for sub in list(self._subscriptions.values()) if sub.pinned),
+            "evicted": self.evicted,
+            "viewing": sorted(self._viewing | ({self.active_bubble} if self.active_bubble else set())),
+            "subscribed": len(self.subscribed),
+            "pending": len(self._pending),
+            "failed": sum(1 for channel, stats in channels.items() if stats["failures"] and channel not in self.subscribed),
+            "latency_ms_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_ms_max": latencies[-1] if latencies else None,
+            "events": self.dispatcher.snapshot(),
+            "channels": channels,
+        }
+
     def disconnect_from_bubble(self, bubble_id):
-        """Disconnect from a specific bubble"""
-        if bubble_id in self.active_connections:
-            print(f"Disconnecting from bubble {bubble_id}")
-            thread = self.active_connections.pop(bubble_id)
-            if thread.is_alive():
-                self.running = False
-            return True
-        return False
-        
+        """Stop watching a bubble: cancels a pending subscribe and sends pusher:unsubscribe; the shared connection stays open"""
+        bubble_id = str(bubble_id)
+        with self._lock:
+            if self._drop(bubble_id) is None:
+                return False
+        print(f"Disconnecting from bubble {bubble_id}")
+        return True
+
     def stop_all(self):
-        """Stop all connections"""
+        """Unsubscribe everything and close the connection"""
         self.running = False
-        for bubble_id, thread in list(self.active_connections.items()):
-            print(f"Stopping connection to bubble {bubble_id}")
-            if thread.is_alive():
-                self.running = False
-        self.active_connections.clear()
\ No newline at end of file
+        with self._lock:
+            for subscription in self._subscriptions.values():
+                if subscription.task is not None and self.loop is not None and not self.loop.is_closed():
+                    self.loop.call_soon_threadsafe(subscription.task.cancel)
+            self._subscriptions.clear()
+            self.channels.clear()
+            self._channel_bubbles.clear()
+        if self._ws is not None:
+            self._submit(self._ws.close())
+        if self._thread and not self._in_loop_thread():
+            self._thread.join(timeout=5)
+        self.dispatcher.stop()
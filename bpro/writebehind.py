@@ -0,0 +1,239 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import threading, time
+from .messagestore import detail_message
+
+# Writes for a bubble wait this long so repeated syncs of it collapse into one transaction
+DEFAULT_FLUSH_DELAY = 0.5
+# Buffered messages across all bubbles before writers have to wait for the disk
+DEFAULT_MAX_PENDING = 5000
+
+class WriteBehindStore:
+    """
+    MessageStore wrapper that keeps message and sync-cursor writes in memory and
+    lets a background thread commit them, so request handlers return without
+    waiting on SQLite.
+
+    Pending writes are keyed by bubble and message id: repeated writes within
+    the flush delay coalesce into one transaction. Reads overlay pending (and
+    in-flight) writes on the database, so callers always see their own writes.
+    When more than max_pending messages are buffered, writers block until the
+    worker catches up. Anything not wrapped here is passed straight through.
+    """
+    def __init__(self, store, flush_delay=DEFAULT_FLUSH_DELAY, max_pending=DEFAULT_MAX_PENDING):
+        self.store = store
+        self.flush_delay = flush_delay
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # One batch in flight at a time
+        self._messages = {}   # bubble_id -> {message_id: (detail, raw)}
+        self._states = {}     # bubble_id -> (high_water, low_water, complete)
+        self._flushing = ({}, {})
+        self._pending = 0
+        self._oldest = None
+        self._thread = None
+        self._running = False
+        self.flushes = 0
+        self.written = 0
+        self.coalesced = 0
+        self.waits = 0
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    # WORKER
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Flush everything still buffered, then stop the worker. Safe to call more than once."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (self._oldest is None or (self._pending < self.max_pending and time.monotonic() - self._oldest < self.flush_delay)):
+                    self._cond.wait(None if self._oldest is None else max(0.0, self.flush_delay - (time.monotonic() - self._oldest)))
+                if not self._running:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Commit everything buffered so far in one transaction."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._cond:
+            if self._oldest is None:
+                return
+            messages, states = self._messages, self._states
+            self._messages, self._states = {}, {}
+            self._flushing = (messages, states)
+            count, self._pending, self._oldest = self._pending, 0, None
+        try:
+            self.store.write_batch({bubble_id: list(items.values()) for bubble_id, items in messages.items()}, states)
+        except Exception as e:
+            print(f"Error writing {count} buffered messages: {e}")
+            with self._cond:
+                # Put the batch back under anything written since, and let the next flush retry
+                for bubble_id, items in messages.items():
+                    merged = dict(items)
+                    merged.update(self._messages.get(bubble_id, {}))
+                    self._messages[bubble_id] = merged
+                for bubble_id, state in states.items():
+                    self._states.setdefault(bubble_id, state)
+                self._pending = sum(len(items) for items in self._messages.values())
+                self._oldest = time.monotonic()
+                self._flushing = ({}, {})
+            return
+        with self._cond:
+            self._flushing = ({}, {})
+            self.flushes += 1
+            self.written += count
+            self._cond.notify_all()
+
+    def _wake(self):
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if not self._running:
+            return
+        if self._pending >= self.max_pending:
+            self._cond.notify_all()
+            self.waits += 1
+            while self._running and self._pending >= self.max_pending:
+                self._cond.wait(1.0)
+        else:
+            self._cond.notify_all()
+
+    def _overlay(self, bubble_id):
+        """Pending and in-flight messages for a bubble, newest write winning."""
+        items = dict(self._flushing[0].get(bubble_id, {}))
+        items.update(self._messages.get(bubble_id, {}))
+        return items
+
+    # WRITES
+    def upsert_messages(self, bubble_id, messages):
+        detailed = []
+        with self._cond:
+            bucket = self._messages.setdefault(int(bubble_id), {})
+            for message in messages:
+                if not isinstance(message, dict) or message.get("id") is None:
+                    continue
+                detail = detail_message(message)
+                detailed.append(detail)
+                message_id = int(detail["message_id"])
+                if message_id in bucket:
+                    self.coalesced += 1
+                else:
+                    self._pending += 1
+                bucket[message_id] = (detail, message)
+            # Callers get copies, so editing a returned message never reaches the buffer
+            detailed = [dict(detail) for detail in detailed]
+            if detailed:
+                self._wake()
+        if detailed and not self._running:
+            self.flush()
+        return detailed
+
+    def set_sync_state(self, bubble_id, high_water, low_water, complete):
+        with self._cond:
+            self._states[int(bubble_id)] = (high_water, low_water, complete)
+            self._wake()
+        if not self._running:
+            self.flush()
+
+    def patch_message(self, message_id, **changes):
+        message_id = int(message_id)
+        with self._cond:
+            for items in self._messages.values():
+                if message_id in items:
+                    detail, raw = items[message_id]
+                    detail = dict(detail, **changes)
+                    items[message_id] = (detail, raw)
+                    return dict(detail)
+        self.flush()
+        return self.store.patch_message(message_id, **changes)
+
+    def delete_message(self, message_id):
+        message_id = int(message_id)
+        with self._cond:
+            for items in self._messages.values():
+                if items.pop(message_id, None) is not None:
+                    self._pending -= 1
+        self.flush()
+        self.store.delete_message(message_id)
+
+    # READS
+    def get_sync_state(self, bubble_id):
+        with self._cond:
+            state = self._states.get(int(bubble_id)) or self._flushing[1].get(int(bubble_id))
+        if state is None:
+            return self.store.get_sync_state(bubble_id)
+        high_water, low_water, complete = state
+        return {"high_water": high_water, "low_water": low_water, "complete": bool(complete), "updated_at": None}
+
+    def get_sync_states(self):
+        states = self.store.get_sync_states()
+        with self._cond:
+            pending = dict(self._flushing[1], **self._states)
+        for bubble_id, (high_water, low_water, complete) in pending.items():
+            states[bubble_id] = {"high_water": high_water, "low_water": low_water, "complete": bool(complete), "updated_at": None}
+        return states
+
+    def get_messages(self, bubble_id, limit=None, before_id=None, after_id=None, since=None, until=None, newest_first=True):
+        with self._cond:
+            pending = self._overlay(int(bubble_id))
+        stored = self.store.get_messages(bubble_id, limit=limit, before_id=before_id, after_id=after_id, since=since, until=until, newest_first=newest_first)
+        if not pending:
+            return stored
+        merged = {int(detail["message_id"]): detail for detail in stored}
+        for message_id, (detail, _) in pending.items():
+            created_at = detail.get("time_of_sending")
+            if before_id is not None and message_id >= int(before_id):
+                continue
+            if after_id is not None and message_id <= int(after_id):
+                continue
+            if since is not None and (created_at is None or created_at < since):
+                continue
+            if until is not None and (created_at is None or created_at > until):
+                continue
+            merged[message_id] = dict(detail)
+        ordered = [merged[message_id] for message_id in sorted(merged, reverse=newest_first)]
+        return ordered[:limit] if limit is not None else ordered
+
+    def get_replies(self, parent_message_id):
+        with self._cond:
+            pending = [detail for items in (self._flushing[0], self._messages) for bucket in items.values() for detail, _ in bucket.values()
+                       if detail.get("parent_message") is not None and int(detail["parent_message"]) == int(parent_message_id)]
+        merged = {int(detail["message_id"]): detail for detail in self.store.get_replies(parent_message_id)}
+        merged.update((int(detail["message_id"]), dict(detail)) for detail in pending)
+        return [merged[message_id] for message_id in sorted(merged)]
+
+    def iter_export_rows(self, bubble_id, after_id=None, batch_size=1000):
+        self.flush()
+        return self.store.iter_export_rows(bubble_id, after_id, batch_size)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "flush_delay": self.flush_delay,
+                "flushes": self.flushes,
+                "written": self.written,
+                "coalesced": self.coalesced,
+                "writer_waits": self.waits,
+            }
@@ -2,11 +2,21 @@
 #Email: paul257@ohs.stanford.edu
 #URL: https://github.com/r0adki110/Better-Pronto
 
-import webview, os, json, re, time, uuid, mimetypes, requests, urllib.parse
+import webview, os, json, re, time, uuid, mimetypes, urllib.parse
 from bpro.pronto import Pronto
+from bpro.uploads import ProntoUploader
 from bpro.systemcheck import *
 from bpro.readjson import ReadJSON
+from bpro.messagestore import MessageStore
+from bpro.codec import codec_from_settings
+from bpro.atomicfile import atomic_open
+from bpro.writebehind import WriteBehindStore
+from bpro.sync import MessageSync
+from bpro.backfill import BackfillScheduler
+from bpro.export import Exporter, DEFAULT_FORMAT, parse_bubble_ids
+from bpro import servermode
 import asyncio
+import atexit
 import threading
 import shutil
 import webbrowser
@@ -25,6 +35,26 @@ userID = user_info["id"] if user_info else None
 # Initialize Pronto instance
 pronto = Pronto()
 
+# Messages live in SQLite under ~/.pro/data, payloads encoded with the storage_codec setting;
+# import the old per-bubble JSON files once
+messagesDBPath = os.path.join(os.path.dirname(chats_path), "messages.db")
+# In gevent mode every store call runs on a real thread rather than the hub
+message_store = servermode.offloaded(MessageStore(messagesDBPath, codec=codec_from_settings(ReadJSON.get_settings(settingsJSONPath))))
+message_store.migrate_json_chats(chats_path)
+# Handlers buffer their writes; a background writer (started from main.py) commits them in
+# coalesced batches, and whatever is still buffered is flushed at exit
+message_store = WriteBehindStore(message_store)
+atexit.register(message_store.stop)
+message_sync = MessageSync(pronto, message_store)
+# Archives full bubble history in the background; started from main.py
+backfill_scheduler = BackfillScheduler(message_sync, lambda: accesstoken, lambda: ReadJSON.get_bubble_ids(bubbleOverviewJSONPath))
+# Streaming NDJSON exports of the archive, one file per bubble under ~/.pro/data/exports
+exportsPath = os.path.join(os.path.dirname(chats_path), "exports")
+exporter = Exporter(message_store, message_sync, lambda: accesstoken)
+
+# Number of messages returned when a chat is opened, matching one bubble.history page
+LOCAL_PAGE_SIZE = 50
+
 def getLocalAccesstoken():
     global accesstoken
     accesstoken = ReadJSON.getaccesstoken(authTokenJSONPath)
@@ -41,6 +71,25 @@ html_path = os.path.join(current_dir, 'frontend', 'chat', 'chat-index.html')
 def save_response_to_file(response_data, file_path):
     ReadJSON.save_response_to_file(response_data, file_path)
 
+def get_bubble_folder(bubbleID):
+    """
+    Folder for a bubble's local files, from the bubble-location index. A folder
+    deleted on disk is recreated where the index says; a bubble with no folder yet
+    gets one under Uncategorized until create_bubble_folders files it.
+    """
+    location = message_store.get_bubble_location(bubbleID)
+    if location is None:
+        # Fills an empty index from disk, then look again
+        message_store.rebuild_bubble_locations(bubbles_path)
+        location = message_store.get_bubble_location(bubbleID)
+    if location is not None and os.path.isdir(location):
+        return location
+    if location is None:
+        location = os.path.join(bubbles_path, "Uncategorized", sanitize_folder_name(str(bubbleID)))
+    os.makedirs(location, exist_ok=True)
+    message_store.set_bubble_locations({bubbleID: location})
+    return location
+
 def getvalueLogin(file_path, value):
     return ReadJSON.getvalueLogin(file_path, value)
 
@@ -49,8 +98,10 @@ def sanitize_folder_name(name):
     sanitized_name = re.sub(r'[<>:"/\\|?*]', '_', name)
     return sanitized_name
 
-def download_image(image_url, save_path, access_token):
-    """Download an image file and save it to the specified path."""
+def download_image(image_url, save_path, access_token, bubbleID=None):
+    """Download an image file and save it to the specified path (relative to the bubble's folder when bubbleID is given)."""
+    if bubbleID is not None:
+        save_path = os.path.join(get_bubble_folder(bubbleID), save_path)
     try:
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
@@ -62,8 +113,8 @@ def download_image(image_url, save_path, access_token):
         
         print(f"Downloading image from {image_url}")
         
-        # Make the request with headers
-        response = requests.get(image_url, headers=headers, stream=True)
+        # Make the request with headers over the shared Pronto connection pool
+        response = pronto.session.get(image_url, headers=headers, stream=True, timeout=pronto.timeout)
         response.raise_for_status()  # Raise an exception for HTTP errors
 
         # Get content type from headers to determine file extension
@@ -81,8 +132,8 @@ def download_image(image_url, save_path, access_token):
                 save_path = f"{save_path}{extension}"
                 print(f"Adding extension {extension} based on content type {content_type}")
         
-        # Save the file
-        with open(save_path, 'wb') as file:
+        # Save the file; a failed download never leaves a truncated image behind
+        with atomic_open(save_path, 'wb') as file:
             for chunk in response.iter_content(chunk_size=8192):
                 if chunk:
                     file.write(chunk)
@@ -99,6 +150,11 @@ def download_image(image_url, save_path, access_token):
         print(f"Error downloading image: {e}")
         return False, save_path, None
 
+def create_uploader(bubbleID, access_token):
+    """A ProntoUploader for bubbleID on the shared Pronto connection pool and timeouts."""
+    return ProntoUploader(token=access_token, bubble_id=bubbleID, base_url=pronto.API_BASE_URL,
+                          session=pronto.session, timeout=pronto.timeout)
+
 class Api:
     def __init__(self, accesstoken):
         self.email = ""
@@ -156,8 +212,15 @@ class Api:
         self.accesstoken = accesstoken
 
         response = pronto.getUsersBubbles(self.accesstoken)
-        save_response_to_file(response, bubbleOverviewJSONPath)
-        ReadJSON.create_bubble_folders(bubbleOverviewJSONPath, bubbles_path, sanitize_folder_name)
+        # Only rewrites bubbleOverview.json when the list changed; returns what changed
+        changes = ReadJSON.save_bubble_overview(response, bubbleOverviewJSONPath)
+        if not changes:
+            return None
+        if changes["added"] or changes["updated"]:
+            ReadJSON.create_bubble_folders(bubbleOverviewJSONPath, bubbles_path, sanitize_folder_name, locations=message_store)
+        print(f"Bubble list changed: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+              f"{len(changes['updated'])} updated, {len(changes['unread'])} unread counts")
+        return changes
 
     def get_dynamicdetailed_messages(self, bubbleID):
         if not bubbleID:
@@ -165,141 +228,127 @@ class Api:
             return {"messages": []}
         print(f"Fetching detailed messages for bubble ID: {bubbleID}")
         try:
-            response = pronto.get_bubble_messages(accesstoken, bubbleID)
-            if response is None or 'messages' not in response:
-                print("401 Unauthorized: Access token may be invalid or expired.")
-                raise Exception("401 Unauthorized")
-            
-            messages = response['messages']
-            detailed_messages = []
-
+            # Only pages newer than what the store already holds are fetched
+            result = message_sync.sync_latest(accesstoken, bubbleID)
+            print(f"Synced {result['new']} new messages for bubble {bubbleID} in {result['pages']} request(s)")
+            # Keep the bubble's folder and its index entry current whenever it gets new messages
+            if result["new"]:
+                get_bubble_folder(bubbleID)
+
+            messages = message_store.get_messages(bubbleID, limit=LOCAL_PAGE_SIZE)
             if not messages:
                 print("No messages found.")
-                return {"messages": detailed_messages}
-
-            for message in messages:
-                if isinstance(message, dict):
-                    content = message.get("message", "")
-
-                    detailed_message = {
-                        "time_of_sending": message.get("created_at"),
-                        "author": message.get("user", {}).get("fullname"),
-                        "profilepicurl": message.get("user", {}).get("profilepicurl"),
-                        "message_id": message.get("id"),
-                        "edit_count": message.get("user_edited_version", 0),
-                        "last_edited": message.get("user_edited_at"),
-                        "parent_message": message.get("parentmessage_id"),
-                        "reactions": message.get("reactionsummary", []),
-                        "content": content,
-                    }
-                    
-                    # Add message regardless of missing data
-                    detailed_messages.append(detailed_message)
-
-            # Save messages to files
-            bubble_folder_path = os.path.join(chats_path, sanitize_folder_name(f"{bubbleID}"))
-            os.makedirs(bubble_folder_path, exist_ok=True)
-            messages_file_path = os.path.join(bubble_folder_path, "messages.json")
-            full_messages_file_path = os.path.join(bubble_folder_path, "fullmessages.json")
-            with open(messages_file_path, "w") as file:
-                json.dump({"messages": detailed_messages}, file, indent=4)
-            with open(full_messages_file_path, "w") as file:
-                json.dump(response, file, indent=4)
-            print(f"Messages saved to {messages_file_path}")
-            print(f"Full response saved to {full_messages_file_path}")
-
-            return {"messages": detailed_messages}
+            return {"messages": messages}
         except Exception as e:
             print(f"Error fetching detailed messages: {e}")
             return {"messages": []}
 
-    def get_Localmessages(self, bubbleID):
+    def get_older_messages(self, bubbleID, before_id, limit=LOCAL_PAGE_SIZE):
+        """Messages older than before_id, fetching another history page if the store runs out."""
+        if not bubbleID or before_id is None:
+            print("Bubble ID or message ID is undefined")
+            return {"messages": [], "complete": False}
+        try:
+            messages = message_sync.older_messages(accesstoken, bubbleID, before_id, limit)
+            for message in messages:
+                message.setdefault("has_image", False)
+                message.setdefault("image_data", None)
+            return {"messages": messages, "complete": message_store.get_sync_state(bubbleID)["complete"]}
+        except Exception as e:
+            print(f"Error fetching older messages: {e}")
+            return {"messages": [], "complete": False}
+
+    def get_Localmessages(self, bubbleID, limit=LOCAL_PAGE_SIZE):
         if not bubbleID:
             print("Bubble ID is undefined")
             return {"messages": []}
         print(f"Fetching local messages for bubble ID: {bubbleID}")  # Debug statement
         try:
-            # Search for the folder with the matching bubble ID in the entire chats_path
-            sanitized_bubble_id = sanitize_folder_name(f"{bubbleID}")
-            bubble_folder_path = None
-            for root, dirs, files in os.walk(chats_path):
-                for dir_name in dirs:
-                    if dir_name == sanitized_bubble_id:
-                        bubble_folder_path = os.path.join(root, dir_name)
-                        break
-                if bubble_folder_path:
-                    break
-
-            if not bubble_folder_path:
-                print(f"No folder found for bubble ID: {bubbleID}")
+            # One indexed query on (bubble_id, message_id)
+            messages = message_store.get_messages(bubbleID, limit=limit)
+            if not messages:
+                print(f"No local messages found for bubble ID: {bubbleID}")
                 return {"messages": []}
 
-            # Read messages from the JSON file within the specific folder for the bubble
-            messages_file_path = os.path.join(bubble_folder_path, "messages.json")
-            full_messages_file_path = os.path.join(bubble_folder_path, "fullmessages.json")
-            with open(messages_file_path, "r") as file:
-                data = json.load(file)
-                messages = data.get("messages", [])
-                detailed_messages = []
-
-                for message in messages:
-                    detailed_message = {
-                        "time_of_sending": message.get("time_of_sending"),
-                        "author": message.get("author"),
-                        "profilepicurl": message.get("profilepicurl"),
-                        "message_id": message.get("message_id"),
-                        "edit_count": message.get("edit_count", 0),
-                        "last_edited": message.get("last_edited"),
-                        "parent_message": message.get("parent_message"),
-                        "reactions": message.get("reactions", []),
-                        "content": message.get("content"),
-                        "has_image": message.get("has_image", False),
-                        "image_data": message.get("image_data")
-                    }
-                    
-                    # Add all messages regardless of missing data
-                    detailed_messages.append(detailed_message)
-
-                # Make sure we don't overwrite existing data
-                with open(full_messages_file_path, "w") as file:
-                    json.dump(data, file, indent=4)
+            for message in messages:
+                message.setdefault("has_image", False)
+                message.setdefault("image_data", None)
 
-                return {"messages": detailed_messages}
+            return {"messages": messages}
         except Exception as e:
             print(f"Error fetching local messages: {e}")
             return {"messages": []}
 
+    def search_messages(self, query, bubbleID=None, author=None, limit=25, offset=0):
+        """Ranked search over the local archive, topped up from message.search for unsynced history."""
+        if not query or not query.strip():
+            return {"results": [], "local": 0, "remote": 0}
+        try:
+            return message_sync.search(accesstoken, query, bubble_id=bubbleID, author=author, limit=limit, offset=offset,
+                                       bubble_ids=ReadJSON.get_bubble_ids(bubbleOverviewJSONPath))
+        except Exception as e:
+            print(f"Error searching messages: {e}")
+            return {"results": [], "local": 0, "remote": 0, "error": str(e)}
+
+    @staticmethod
+    def _export_name(name):
+        return sanitize_folder_name(name or "").strip(". ") or time.strftime("%Y%m%d-%H%M%S")
+
+    def prepare_export(self, bubbleIDs=None, fmt=DEFAULT_FORMAT, name=None):
+        """Validate an export request; returns (bubble ids, folder name) or raises ValueError."""
+        bubble_ids = parse_bubble_ids(bubbleIDs or ReadJSON.get_bubble_ids(bubbleOverviewJSONPath) or [])
+        name = self._export_name(name)
+        exporter.check(os.path.join(exportsPath, name), fmt)
+        return bubble_ids, name
+
+    def try_start_export(self):
+        """Claim the exporter; pass claimed=True to export_bubbles when this returns True."""
+        return exporter.try_start()
+
+    def export_bubbles(self, bubbleIDs=None, fmt=DEFAULT_FORMAT, fetch_gaps=True, name=None, claimed=False):
+        """Export bubbles (all by default) to exports/<name>; rerunning the same name resumes it."""
+        # export() validates the ids and format itself, and releases a claimed run if they are bad
+        name = self._export_name(name)
+        return exporter.export(bubbleIDs or ReadJSON.get_bubble_ids(bubbleOverviewJSONPath) or [], os.path.join(exportsPath, name),
+                               fmt=fmt, fetch_gaps=fetch_gaps, claimed=claimed)
+
+    def export_progress(self):
+        return exporter.progress()
+
     ## Local JSON Fetching and Parsing
     def get_Localdms(self, *args):
         print("Fetching DMs")
         dms = ReadJSON.get_dms(bubbleOverviewJSONPath)
-        print("DMs:", dms)
+        print("DMs:", len(dms))
         return dms
 
     def get_Localcategorized_bubbles(self, *args):
         print("Fetching categorized bubbles")
         categorized_bubbles = ReadJSON.get_categorized_bubbles(bubbleOverviewJSONPath)
-        print("Categorized Bubbles:", categorized_bubbles)
+        print("Categorized Bubbles:", len(categorized_bubbles))
         return categorized_bubbles
 
     def get_Localuncategorized_bubbles(self, *args):
         print("Fetching uncategorized bubbles")
         uncategorized_bubbles = ReadJSON.get_uncategorized_bubbles(bubbleOverviewJSONPath)
-        print("Uncategorized Bubbles:", uncategorized_bubbles)
+        print("Uncategorized Bubbles:", len(uncategorized_bubbles))
         return uncategorized_bubbles
 
     def get_Localunread_bubbles(self, *args):
         print("Fetching unread bubbles")
         unread_bubbles = ReadJSON.get_unread_bubbles(bubbleOverviewJSONPath)
-        print("Unread Bubbles:", unread_bubbles)
+        print("Unread Bubbles:", len(unread_bubbles))
         return unread_bubbles
 
     def get_Localcategories(self, *args):
         print("Fetching categories")
         categories = ReadJSON.get_categories(bubbleOverviewJSONPath)
-        print("Categories:", categories)
+        print("Categories:", len(categories))
         return categories
 
+    def get_sidebar_snapshot(self, *args):
+        return ReadJSON.get_sidebar_snapshot(bubbleOverviewJSONPath)
+
     def print_chat_info(self, chat_name, chat_id):
         print(f"Clicked on chat: {chat_name}, ID: {chat_id}")
 
@@ -328,6 +377,15 @@ class Api:
                 'error': str(e)
             }
 
+    def send_file(self, bubbleID, file_path, message=""):
+        print(f"Sending file to bubble ID {bubbleID}: {file_path}")
+        try:
+            message_id = create_uploader(bubbleID, accesstoken).send(file_path, text=message)
+            return {'ok': True, 'message_id': message_id}
+        except Exception as e:
+            print(f"Error sending file: {e}")
+            return {'ok': False, 'error': str(e)}
+
     def markBubbleAsRead(self, bubbleID, message_id=None):
         print(f"DEBUG: markBubbleAsRead called for bubble {bubbleID}, message_id: {message_id}")
         try:
@@ -353,6 +411,7 @@ class Api:
             print(f"Deleted message {messageID}: {response}")
             if isinstance(response, dict):
                 if response.get('ok'):
+                    message_store.delete_message(messageID)
                     return {"ok": True, "response": response}
                 else:
                     return {
@@ -7,6 +7,7 @@ let autoScrollToBottom = true; // Flag to control automatic scrolling
 let typingUsers = {};          // Track users currently typing
 let typingTimeout = null;      // Timeout to hide typing indicator after inactivity
 let socket = null;             // Will store socket.io connection
+let viewedBubbleId = null;     // Bubble whose Socket.IO room this page has joined
 
 // New: format full YYYY‑MM‑DD HH:MM:SS UTC into local time string
 function formatDateTime(raw) {
@@ -539,6 +540,26 @@ async function deleteMessage(messageId) {
     }
 }
 
+// Insert, update or remove one message in the open chat
+function applyMessageDelta(delta) {
+    // The sidebar owns the selection state
+    const openBubbleId = typeof currentSelectedBubbleId !== 'undefined' ? currentSelectedBubbleId : currentChatId;
+    if (!delta || String(delta.bubble_id) !== String(openBubbleId)) return;
+
+    const sameId = msg => String(msg.message_id || msg.id) === String(delta.message_id);
+    const index = currentMessages.findIndex(sameId);
+    if (delta.op === 'delete') {
+        if (index === -1) return;
+        currentMessages.splice(index, 1);
+    } else if (index === -1) {
+        currentMessages.push(delta.message);
+    } else {
+        // Keep fields the server does not send, such as downloaded image data
+        currentMessages[index] = { ...currentMessages[index], ...delta.message };
+    }
+    renderMessages(currentMessages, currentChatName);
+}
+
 // Helper function to get current time in HH:MM format
 function getCurrentTime() {
     const now = new Date();
@@ -595,6 +616,13 @@ document.addEventListener('DOMContentLoaded', function() {
 function initSocketConnection() {
     socket = io();
 
+    // Rooms are dropped on disconnect, so rejoin the open bubble's room on every (re)connect
+    socket.on('connect', function() {
+        if (viewedBubbleId !== null) {
+            socket.emit('view_bubble', { bubble_id: viewedBubbleId });
+        }
+    });
+
     // Handle typing indicator
     socket.on('typing', function(data) {
         // ...existing code...
@@ -605,6 +633,9 @@ function initSocketConnection() {
         // ...existing code...
     });
 
+    // Apply single-message changes pushed from Pusher events instead of refetching history
+    socket.on('message_delta', applyMessageDelta);
+
     // Handle ws_log event
     socket.on('ws_log', function(data) {
         const wsLog = document.getElementById('ws-log');
@@ -614,4 +645,12 @@ function initSocketConnection() {
         wsLog.appendChild(entry);
         wsLog.scrollTop = wsLog.scrollHeight;
     });
-}
\ No newline at end of file
+}
+
+// Join the Socket.IO room of the bubble being viewed so only its events reach this page
+function viewBubble(bubbleId) {
+    viewedBubbleId = bubbleId;
+    if (socket && socket.connected) {
+        socket.emit('view_bubble', { bubble_id: bubbleId });
+    }
+}
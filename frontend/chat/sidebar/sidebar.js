@@ -15,29 +15,112 @@ let collapsedCategories = {};
 let currentSelectedBubbleId = null;
 let allCategoriesCollapsed = false;
 
-// API methods wrapper
-const api = {
-    get_Localdms: async () => {
-        const response = await fetch('/api/get_Localdms');
-        return response.ok ? response.json() : [];
-    },
-    get_Localcategorized_bubbles: async () => {
-        const response = await fetch('/api/get_Localcategorized_bubbles');
-        return response.ok ? response.json() : {};
-    },
-    get_Localuncategorized_bubbles: async () => {
-        const response = await fetch('/api/get_Localuncategorized_bubbles');
-        return response.ok ? response.json() : [];
-    },
-    get_Localunread_bubbles: async () => {
-        const response = await fetch('/api/get_Localunread_bubbles');
-        return response.ok ? response.json() : [];
-    },
-    get_Localcategories: async () => {
-        const response = await fetch('/api/get_Localcategories');
-        return response.ok ? response.json() : [];
+// Sidebar snapshot: one request for all five views, revalidated with its ETag
+let sidebarSnapshotETag = null;
+
+// Resolves to the snapshot, or null when it is unchanged since the last fetch (304)
+async function fetchSidebarSnapshot() {
+    const headers = sidebarSnapshotETag ? { 'If-None-Match': sidebarSnapshotETag } : {};
+    const response = await fetch('/api/sidebar_snapshot', { headers, cache: 'no-store' });
+    if (response.status === 304) return null;
+    if (!response.ok) throw new Error(`Failed to fetch sidebar snapshot: ${response.status}`);
+    sidebarSnapshotETag = response.headers.get('ETag');
+    return response.json();
+}
+
+function applySidebarSnapshot(snapshot) {
+    directMessages = snapshot.dms || [];
+    categorizedBubbles = snapshot.categorized || {};
+    uncategorizedBubbles = snapshot.uncategorized || [];
+    unreadBubbles = snapshot.unread || [];
+    categories = snapshot.categories || [];
+}
+
+const byTitle = (a, b) => (a.title < b.title ? -1 : a.title > b.title ? 1 : 0);
+
+// Patch the sidebar with a change set from /api/get_live_bubbles or the 'bubbles_changed' event
+function applyBubbleChanges(changes) {
+    if (!changes || !isDataLoaded) return;
+
+    const removeBubble = (id) => {
+        directMessages = directMessages.filter(b => b.id !== id);
+        uncategorizedBubbles = uncategorizedBubbles.filter(b => b.id !== id);
+        for (const category of Object.keys(categorizedBubbles)) {
+            categorizedBubbles[category] = categorizedBubbles[category].filter(b => b.id !== id);
+            if (categorizedBubbles[category].length === 0) delete categorizedBubbles[category];
+        }
+    };
+
+    (changes.removed || []).forEach(id => {
+        removeBubble(id);
+        unreadBubbles = unreadBubbles.filter(b => (b.bubble_id ?? b.id) !== id);
+    });
+
+    [...(changes.added || []), ...(changes.updated || [])].forEach(bubble => {
+        removeBubble(bubble.id);
+        const entry = { id: bubble.id, title: bubble.title };
+        if (bubble.isdm) {
+            directMessages.push(entry);
+        } else if (bubble.category) {
+            (categorizedBubbles[bubble.category] = categorizedBubbles[bubble.category] || []).push(entry);
+        } else {
+            uncategorizedBubbles.push(entry);
+        }
+    });
+
+    (changes.unread || []).forEach(stat => {
+        unreadBubbles = unreadBubbles.filter(b => (b.bubble_id ?? b.id) !== stat.bubble_id);
+        if (stat.unread > 0 || stat.unread_mentions > 0 || stat.marked_unread > 0) {
+            unreadBubbles.push({
+                bubble_id: stat.bubble_id,
+                title: stat.title,
+                unread: stat.unread,
+                unread_mentions: stat.unread_mentions
+            });
+        }
+    });
+
+    // Keep the same ordering the server uses
+    directMessages.sort(byTitle);
+    uncategorizedBubbles.sort(byTitle);
+    categories = Object.keys(categorizedBubbles).sort();
+    const sortedGroups = {};
+    categories.forEach(category => { sortedGroups[category] = categorizedBubbles[category].sort(byTitle); });
+    categorizedBubbles = sortedGroups;
+
+    // Only adopt the new ETag if we were in sync before this change set
+    if (sidebarSnapshotETag && sidebarSnapshotETag === `"${changes.previous_etag}"`) {
+        sidebarSnapshotETag = `"${changes.etag}"`;
     }
-};
+    renderSidebar(currentSearchTerm);
+}
+
+// Listen for bubble list change sets pushed by the server
+function setupBubbleChangeListener() {
+    if (typeof io !== 'function') return;
+    // io() shares the page's existing Socket.IO connection
+    const sidebarSocket = io();
+    sidebarSocket.on('bubbles_changed', applyBubbleChanges);
+
+    // Opt in to activity pings from every bubble so unread badges move between polls
+    sidebarSocket.on('connect', () => sidebarSocket.emit('watch_all_bubbles', { enabled: true }));
+    sidebarSocket.on('bubble_activity', markBubbleActivity);
+}
+
+// Bump the unread badge of a bubble that got a new message while not open
+function markBubbleActivity(activity) {
+    if (!isDataLoaded || !/Added|Created/.test(activity.event) || activity.bubble_id == currentSelectedBubbleId) return;
+    const id = Number(activity.bubble_id);
+    const existing = unreadBubbles.find(b => (b.bubble_id ?? b.id) == id);
+    if (existing) {
+        existing.unread = (existing.unread || 0) + 1;
+    } else {
+        const bubble = [...directMessages, ...uncategorizedBubbles, ...Object.values(categorizedBubbles).flat()].find(b => b.id == id);
+        if (!bubble) return;
+        unreadBubbles.push({ bubble_id: bubble.id, title: bubble.title, unread: 1, unread_mentions: 0 });
+    }
+    renderSidebar(currentSearchTerm);
+}
 
 // Check API availability recursively until available
 function checkApiAvailability() {
@@ -63,21 +146,9 @@ async function loadInitialChatData() {
     try {
         console.log('Loading initial chat data from local storage...');
         
-        // Load local data in parallel
-        const [dms, categorizedChats, uncategorizedChats, unreadChats, categoryList] = await Promise.all([
-            api.get_Localdms(),
-            api.get_Localcategorized_bubbles(),
-            api.get_Localuncategorized_bubbles(),
-            api.get_Localunread_bubbles(),
-            api.get_Localcategories()
-        ]);
-        
-        // Store the data
-        directMessages = dms || [];
-        categorizedBubbles = categorizedChats || {};
-        uncategorizedBubbles = uncategorizedChats || [];
-        unreadBubbles = unreadChats || [];
-        categories = categoryList || [];
+        // Load all local views in one request
+        sidebarSnapshotETag = null;
+        applySidebarSnapshot(await fetchSidebarSnapshot());
         
         console.log('Initial chat data loaded from local storage:', {
             dms: directMessages.length,
@@ -110,28 +181,20 @@ async function fetchLiveBubbleData() {
         if (!liveBubblesResponse.ok) {
             throw new Error(`Failed to fetch live bubbles: ${liveBubblesResponse.status}`);
         }
-        console.log('Live bubble data fetched and saved');
-        
-        // Reload data from local storage
-        const [dmsResponse, categorizedChatsResponse, uncategorizedChatsResponse, unreadChatsResponse, categoryListResponse] = await Promise.all([
-            fetch('/api/get_Localdms'),
-            fetch('/api/get_Localcategorized_bubbles'),
-            fetch('/api/get_Localuncategorized_bubbles'),
-            fetch('/api/get_Localunread_bubbles'),
-            fetch('/api/get_Localcategories')
-        ]);
-        
-        // Parse and update data
-        directMessages = await dmsResponse.json() || [];
-        categorizedBubbles = await categorizedChatsResponse.json() || {};
-        uncategorizedBubbles = await uncategorizedChatsResponse.json() || [];
-        unreadBubbles = await unreadChatsResponse.json() || [];
-        categories = await categoryListResponse.json() || [];
+        const { changes } = await liveBubblesResponse.json();
+        console.log('Live bubble data fetched', changes ? 'with changes' : 'unchanged');
+        applyBubbleChanges(changes);
         
-        console.log('Updated chat data loaded');
-        
-        isDataLoaded = true;
-        renderSidebar(currentSearchTerm);
+        // Revalidate against the server copy; a 304 means we are in sync, so skip the re-render
+        const snapshot = await fetchSidebarSnapshot();
+        if (snapshot) {
+            applySidebarSnapshot(snapshot);
+            console.log('Updated chat data loaded');
+            isDataLoaded = true;
+            renderSidebar(currentSearchTerm);
+        } else {
+            console.log('Chat data unchanged');
+        }
         
         // Refresh messages if there's a selected bubble
         if (currentSelectedBubbleId) {
@@ -907,6 +970,7 @@ function selectChat(chatId) {
     }
     
     currentSelectedBubbleId = chatId;
+    if (typeof viewBubble === 'function') viewBubble(chatId);
     
     // Find the chat in our data structures
     let selectedChat = null;
@@ -1189,6 +1253,7 @@ function init() {
     setupSearchToggle();
     setupCollapseAllButton();
     setupSettingsButton();
+    setupBubbleChangeListener();
     checkApiAvailability();
     
     // Handle route-based navigation for URLs like /chat/chatId
@@ -2,13 +2,17 @@
 # main.py — Better‑Pronto
 # Author: Paul Estrada <paul257@ohs.stanford.edu>
 
-import os, re, json, datetime, threading, time, socket, webbrowser, sys
+import sys
+# Pick the server mode before anything else is imported: gevent has to patch the stdlib first
+from bpro import servermode
+SERVER_MODE = servermode.patch(servermode.get_server_mode(sys.argv[1:]))
+
+import os, re, json, datetime, threading, time, socket, webbrowser
 from flask import Flask, send_from_directory, jsonify, request, redirect
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from bpro.systemcheck import createappfolders
 from bpro.readjson import ReadJSON
-from bpro.pronto import Pronto
-from bproapi import Api
+from bproapi import Api, pronto, backfill_scheduler, message_sync, message_store
 
 # ─── Debug: ensure this file is the one you're editing ───────────────────────────
 print("=== LOADED main.py:", __file__, " | __name__=", __name__, " ===")
@@ -19,6 +23,7 @@ PORT = DEFAULT_PORT   # This will be potentially updated if default port is in u
 default_chat_id = None
 accesstoken = ""
 ws_client = None  # Track the WebSocket client globally
+WATCH_ALL_BUBBLES = True  # Subscribe to every bubble at startup, not just the open one
 
 # ─── Filesystem prep & token loading ────────────────────────────────────────────
 (auth_path, chats_path, bubbles_path,
@@ -42,13 +47,14 @@ userID = user_info.get("id")
 print("User ID:", userID)
 
 # ─── Pronto & API setup ─────────────────────────────────────────────────────────
-pronto = Pronto()
+# Reuse the Pronto instance from bproapi so every call shares one connection pool
 api = Api(accesstoken)
 print("API methods:", dir(api))
 
 # ─── Flask & SocketIO setup ────────────────────────────────────────────────────
 app = Flask(__name__, static_folder='frontend', static_url_path='/')
-socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*")
+socketio = SocketIO(app, async_mode=SERVER_MODE, cors_allowed_origins="*")
+print(f"Server mode: {SERVER_MODE}")
 browser_opened = False
 
 def check_port_available(port):
@@ -112,12 +118,14 @@ def start_websocket_client():
 
     try:
         from bpro.websocketClient import WebSocketClient
+        from bpro.asyncpronto import AsyncPronto
         
-        # Hardcode the api base url since the Api class doesn't have this attribute
-        api_base_url = "https://stanfordohs.pronto.io"
+        # Same base URL the endpoint registry builds every request from
+        api_base_url = pronto.API_BASE_URL
         
         # Create WebSocketClient instance with callback
-        ws_client = WebSocketClient(api_base_url, accesstoken, on_ws_event)
+        # pusher.auth goes through the same cache, rate limiter and metrics as every other call
+        ws_client = WebSocketClient(api_base_url, accesstoken, on_ws_event, timeout=pronto.timeout, client=AsyncPronto.sharing(pronto))
         
         # Set default chat bubble to connect to
         bubble_to_sub = "4209040"  # Changed to a bubble we know works
@@ -129,6 +137,8 @@ def start_websocket_client():
         # Connect to the default bubble
         if ws_client.connect_to_bubble(bubble_to_sub):
             print(f"WebSocket client connected to default bubble {bubble_to_sub}")
+            if WATCH_ALL_BUBBLES:
+                ws_client.watch_all()
             return True
         else:
             print(f"Failed to connect to default bubble {bubble_to_sub}")
@@ -140,33 +150,63 @@ def start_websocket_client():
         return False
 
 # ─── WebSocket → Socket.IO bridge ───────────────────────────────────────────────
+def format_message_time(m):
+    """A copy with the raw timestamp in created_at and H:MM AM/PM in time_of_sending"""
+    m = dict(m)  # Store reads may share their dicts; never rewrite them in place
+    raw = m.get("time_of_sending")
+    if raw:
+        m["created_at"]=raw
+        try:
+            dt = datetime.datetime.strptime(raw,"%Y-%m-%d %H:%M:%S")
+            m["time_of_sending"]=dt.strftime("%-I:%M %p")
+        except:
+            pass
+    return m
+
+# Clients join the room of the bubble they are viewing; per-bubble events go only there
+ALL_BUBBLES_ROOM = "bubbles:all"  # Opt-in: one small activity ping per bubble event, for unread badges
+
+def bubble_room(bubble_id):
+    return f"bubble:{bubble_id}"
+
 def on_ws_event(e):
     et = e.get("event","").split("\\")[-1]
     data = json.loads(e.get("data","{}"))
     bubble_id = e.get("_bubble_id", "unknown")  # Get the bubble ID from the event
+    room = bubble_room(bubble_id)
     
     print(f"WS event from bubble {bubble_id}: {et}")
+
+    # Evict cached bubble/user reads this event makes stale
+    pronto.cache.invalidate_for_event(et, bubble_id, data)
+
+    # Message create/edit/delete/reaction: update the local store and push just that message
+    delta = message_sync.apply_event(et, bubble_id, data)
+    if delta:
+        if delta["message"]:
+            delta = dict(delta, message=format_message_time(delta["message"]))
+        socketio.emit("message_delta", delta, to=room)
+        socketio.emit("bubble_activity", {"bubble_id": bubble_id, "op": delta["op"], "event": et}, to=ALL_BUBBLES_ROOM)
     
-    # Use emit without the broadcast parameter to fix the error
     if et=="UserTyping":
         event_data = {
             "user_id": data.get("user_id"),
             "thread_id": data.get("thread_id"),
             "bubble_id": bubble_id
         }
-        socketio.emit("user_typing", event_data)
+        socketio.emit("user_typing", event_data, to=room)
     elif et=="UserStoppedTyping":
         event_data = {
             "user_id": data.get("user_id"),
             "bubble_id": bubble_id
         }
-        socketio.emit("user_stopped_typing", event_data)
+        socketio.emit("user_stopped_typing", event_data, to=room)
     
     # Emit raw log entry
     socketio.emit("ws_log", {
         "bubble_id": bubble_id,
         "event": et
-    })
+    }, to=room)
 
 # ─── Auth routes ────────────────────────────────────────────────────────────────
 @app.route("/login")
@@ -247,6 +287,52 @@ def api_methods():
 def get_access_token():
     return jsonify(accesstoken=accesstoken) if accesstoken else (jsonify(error="No token"),404)
 
+@app.route("/api/pronto_stats")
+def pronto_stats():
+    """Request counters (latency, throttled, retried, given up) for tuning rate limits"""
+    return jsonify(pronto.stats())
+
+@app.route("/api/ws_stats")
+def ws_stats():
+    """Per-channel Pusher subscription latency and failures"""
+    if not ws_client: return jsonify(error="WebSocket client not initialized"), 503
+    return jsonify(ws_client.subscription_stats())
+
+@app.route("/api/store_stats")
+def store_stats():
+    return jsonify(message_store.stats())
+
+@app.route("/api/backfill_progress")
+def backfill_progress():
+    return jsonify(backfill_scheduler.progress())
+
+@app.route("/api/export", methods=["POST"])
+def export_bubbles():
+    d = request.json or {}
+    fmt = d.get("format", "ndjson.gz")
+    try:
+        # Bad ids or formats are reported here, not just logged by the background task
+        bubble_ids, name = api.prepare_export(d.get("bubbleIDs"), fmt, d.get("name"))
+    except ValueError as e:
+        return jsonify(error=str(e)),400
+    # Claimed here, so a second request gets its 409 before any task starts
+    if not api.try_start_export(): return jsonify(error="An export is already running"),409
+    socketio.start_background_task(api.export_bubbles, bubble_ids, fmt, d.get("fetchGaps", True), name, claimed=True)
+    return jsonify(ok=True, name=name), 202
+
+@app.route("/api/export_progress")
+def export_progress():
+    return jsonify(api.export_progress())
+
+@app.route("/api/sidebar_snapshot")
+def sidebar_snapshot():
+    """All five sidebar views in one response; unchanged polls get a bodyless 304"""
+    etag, body = api.get_sidebar_snapshot()
+    resp = app.response_class(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
 @app.route("/api/get_Localdms")
 def get_local_dms():
     return jsonify(api.get_Localdms() or [])
@@ -270,8 +356,11 @@ def get_local_categories():
 @app.route("/api/get_live_bubbles")
 def get_live_bubbles():
     try:
-        api.get_live_bubbles()
-        return jsonify(success=True)
+        changes = servermode.offload(api.get_live_bubbles)
+        # Push the change set so open sidebars patch themselves instead of refetching
+        if changes and any(changes[k] for k in ("added", "removed", "updated", "unread")):
+            socketio.emit("bubbles_changed", changes)
+        return jsonify(success=True, changes=changes)
     except Exception as e:
         return jsonify(error=str(e)), 500
 
@@ -279,27 +368,37 @@ def get_live_bubbles():
 def get_local_messages():
     bid = request.args.get("bubbleID")
     if not bid: return jsonify(error="bubbleID missing"),400
-    return jsonify(api.get_Localmessages(bid) or [])
+    return jsonify(servermode.offload(api.get_Localmessages, bid) or [])
 
 @app.route("/api/get_dynamicdetailed_messages")
 def get_dynamic_messages():
     bid = request.args.get("bubbleID")
     if not bid: return jsonify(error="bubbleID missing"),400
     try:
-        resp = api.get_dynamicdetailed_messages(bid)
-        for m in resp.get("messages",[]):
-            raw = m.get("time_of_sending")
-            if raw:
-                m["created_at"]=raw
-                try:
-                    dt = datetime.datetime.strptime(raw,"%Y-%m-%d %H:%M:%S")
-                    m["time_of_sending"]=dt.strftime("%-I:%M %p")
-                except:
-                    pass
+        resp = servermode.offload(api.get_dynamicdetailed_messages, bid)
+        resp["messages"] = [format_message_time(m) for m in resp.get("messages",[])]
         return jsonify(resp)
     except Exception as e:
         return jsonify(error=str(e)),500
 
+@app.route("/api/get_older_messages")
+def get_older_messages():
+    bid = request.args.get("bubbleID")
+    before = request.args.get("before", type=int)
+    if not bid or before is None: return jsonify(error="bubbleID or before missing"),400
+    return jsonify(servermode.offload(api.get_older_messages, bid, before))
+
+@app.route("/api/search")
+def search_messages():
+    q = request.args.get("q", "")
+    if not q.strip(): return jsonify(error="q missing"),400
+    limit = max(1, min(request.args.get("limit", 25, type=int), 100))
+    offset = max(0, request.args.get("offset", 0, type=int))
+    resp = servermode.offload(api.search_messages, q, request.args.get("bubbleID", type=int),
+                              request.args.get("author"), limit, offset)
+    resp["results"] = [format_message_time(m) for m in resp.get("results", [])]
+    return jsonify(resp)
+
 @app.route("/api/send_message", methods=["POST"])
 def send_message():
     data = request.json or {}
@@ -359,10 +458,14 @@ def set_active_bubble():
     
     if not bubble_id:
         return jsonify(error="bubbleId required"), 400
+
+    # The open bubble jumps the history backfill queue
+    backfill_scheduler.set_active(bubble_id)
     
     try:    
-        # Connect to the new bubble
+        # Connect to the new bubble; it is never idle-evicted while it stays open
         success = ws_client.connect_to_bubble(bubble_id)
+        ws_client.set_active(bubble_id)
         
         if success:
             return jsonify(success=True, message=f"Connected to bubble {bubble_id}")
@@ -377,21 +480,52 @@ def set_active_bubble():
 def handle_connect():
     print("SocketIO: Client connected")
 
+# Socket.IO client id -> bubble it has open, so the Pusher client keeps those subscribed
+viewers = {}
+
+def update_viewing():
+    if ws_client:
+        ws_client.set_viewing(viewers.values())
+
 @socketio.on('disconnect')
 def handle_disconnect():
     print("SocketIO: Client disconnected")
+    if viewers.pop(request.sid, None) is not None:
+        update_viewing()
+
+@socketio.on('view_bubble')
+def handle_view_bubble(data):
+    """Move this client into the room of the bubble it is now viewing."""
+    bubble_id = (data or {}).get("bubble_id")
+    for room in rooms():
+        if room.startswith("bubble:") and room != bubble_room(bubble_id):
+            leave_room(room)
+    if bubble_id is not None:
+        join_room(bubble_room(bubble_id))
+        viewers[request.sid] = bubble_id
+        print(f"SocketIO: Client {request.sid} viewing bubble {bubble_id}")
+    else:
+        viewers.pop(request.sid, None)
+    update_viewing()
+
+@socketio.on('watch_all_bubbles')
+def handle_watch_all_bubbles(data):
+    """Opt in (or out) of activity pings for every bubble."""
+    if (data or {}).get("enabled", True):
+        join_room(ALL_BUBBLES_ROOM)
+    else:
+        leave_room(ALL_BUBBLES_ROOM)
 
 @socketio.on('user_typing')
 def handle_user_typing(data):
     print(f"SocketIO: User typing event: {data}")
-    # Re-emit to all clients without broadcast parameter
-    socketio.emit("user_typing", data)
+    # Relay to the other clients viewing the same bubble
+    emit("user_typing", data, to=bubble_room(data.get("bubble_id")), include_self=False)
 
 @socketio.on('user_stopped_typing')
 def handle_user_stopped_typing(data):
     print(f"SocketIO: User stopped typing event: {data}")
-    # Re-emit to all clients without broadcast parameter
-    socketio.emit("user_stopped_typing", data)
+    emit("user_stopped_typing", data, to=bubble_room(data.get("bubble_id")), include_self=False)
 
 # ─── Main entrypoint ────────────────────────────────────────────────────────────
 if __name__=="__main__":
@@ -418,6 +552,8 @@ if __name__=="__main__":
 
     # Start the WebSocket client AFTER server initialization
     socketio.start_background_task(start_websocket_client)
+    message_store.start()
+    backfill_scheduler.start()
 
     try:
         # Start the server - this call blocks until server stops
@@ -426,7 +562,11 @@ if __name__=="__main__":
                     port=PORT,
                     debug=False,
                     use_reloader=False,
-                    log_output=True)
+                    log_output=True,
+                    **servermode.run_kwargs())
     except Exception as e:
         print(f"× Server failed to start: {e}")
         sys.exit(1)
+    finally:
+        # Commit any buffered message writes before the process exits
+        message_store.stop()
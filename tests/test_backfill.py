@@ -0,0 +1,36 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+from bpro import backfill
+from bpro.backfill import BackfillScheduler
+from bpro.messagestore import MessageStore
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+class SlowSync:
+    """Every page takes four seconds on the fake clock."""
+    def __init__(self, store, clock):
+        self.store = store
+        self.clock = clock
+
+    def sync_latest(self, access_token, bubble_id, max_pages=1):
+        self.clock.now += 4
+        return {"new": 50, "pages": 1}
+
+def test_page_rate_ignores_time_between_fetches(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(backfill, "time", clock)
+    scheduler = BackfillScheduler(SlowSync(MessageStore(str(tmp_path / "messages.db")), clock), lambda: "token", lambda: [1])
+    for _ in range(3):
+        scheduler._step("token", 1)
+        # Budget waits, backoff and idle time between pages
+        clock.now += 600
+    progress = scheduler.progress()
+    assert progress["pages_fetched"] == 3
+    assert progress["pages_per_minute"] == 15.0
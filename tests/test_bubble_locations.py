@@ -0,0 +1,29 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import os
+from bpro.messagestore import MessageStore
+from bpro.readjson import ReadJSON
+
+def test_index_is_rebuilt_from_disk_when_empty(tmp_path):
+    bubbles = tmp_path / "bubbles"
+    (bubbles / "DMs" / "12").mkdir(parents=True)
+    store = MessageStore(str(tmp_path / "messages.db"))
+    assert store.rebuild_bubble_locations(str(bubbles)) == 1
+    assert store.get_bubble_location(12) == str(bubbles / "DMs" / "12")
+    # A populated index is not rescanned
+    (bubbles / "DMs" / "13").mkdir()
+    assert store.rebuild_bubble_locations(str(bubbles)) == 0
+
+def test_deleted_folders_are_recreated(tmp_path, monkeypatch):
+    overview = ([{"id": 12}], {"Classes": [{"id": 30}]}, [], None)
+    monkeypatch.setattr(ReadJSON, "getdetailedbubbleoverview", staticmethod(lambda path: overview))
+    bubbles = str(tmp_path / "bubbles")
+    store = MessageStore(str(tmp_path / "messages.db"))
+    ReadJSON.create_bubble_folders("overview.json", bubbles, lambda name: name, locations=store)
+    class_folder = os.path.join(bubbles, "Classes", "30")
+    assert store.get_bubble_location(30) == class_folder and os.path.isdir(class_folder)
+    os.rmdir(class_folder)
+    ReadJSON.create_bubble_folders("overview.json", bubbles, lambda name: name, locations=store)
+    assert os.path.isdir(class_folder)
@@ -0,0 +1,38 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import asyncio
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("aiohttp")
+
+from bpro.pronto import Pronto, build_handler
+from bpro.asyncpronto import AsyncPronto
+
+def test_sync_and_async_clients_send_the_same_request():
+    sent = []
+    def send(request):
+        sent.append((request.url, request.payload))
+        return {"ok": True}
+    async def asend(request):
+        return send(request)
+    pronto = Pronto(middleware=[])
+    pronto._handler = send
+    client = AsyncPronto(middleware=[])
+    client._handler = asend
+    assert pronto.kickUserFromBubble("token", 5, [7]) == {"ok": True}
+    assert asyncio.run(client.kickUserFromBubble("token", 5, [7])) == {"ok": True}
+    assert sent[0] == sent[1]
+
+def test_shared_async_client_counts_against_pronto():
+    pronto = Pronto()
+    client = AsyncPronto.sharing(pronto)
+    async def send(request):
+        return {"auth": "signature"}
+    client._send = send
+    client._handler = build_handler(client._send, client.middleware, attr="acall")
+    assert asyncio.run(client.pusherAuth("token", "1.2", "private-bubble.5.code")) == {"auth": "signature"}
+    assert pronto.stats()["endpoints"]["pusher.auth"]["calls"] == 1
+    assert client.rate_limiter is pronto.rate_limiter
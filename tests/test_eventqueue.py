@@ -0,0 +1,40 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import threading
+from bpro.eventqueue import EventDispatcher
+
+def blocked_dispatcher(max_depth):
+    """A one-worker dispatcher whose worker is held on a first event until release is set."""
+    handled, release, busy = [], threading.Event(), threading.Event()
+    def handler(event):
+        busy.set()
+        release.wait(5)
+        handled.append(event["event"])
+    dispatcher = EventDispatcher(handler, workers=1, max_depth=max_depth)
+    dispatcher.start()
+    dispatcher.offer({"event": "Start", "_bubble_id": 1})
+    busy.wait(5)
+    return dispatcher, handled, release
+
+def test_events_are_handled_in_arrival_order():
+    dispatcher, handled, release = blocked_dispatcher(max_depth=10)
+    for name in ("UserTyping", "MessageAdded", "UserStoppedTyping", "MessageUpdated"):
+        assert dispatcher.offer({"event": name, "_bubble_id": 1})
+    release.set()
+    dispatcher.stop()
+    assert handled == ["Start", "UserTyping", "MessageAdded", "UserStoppedTyping", "MessageUpdated"]
+
+def test_full_shard_sheds_droppable_events_behind_critical_ones():
+    dispatcher, handled, release = blocked_dispatcher(max_depth=3)
+    for name in ("MessageAdded", "UserTyping", "MessageUpdated"):
+        assert dispatcher.offer({"event": name, "_bubble_id": 1})
+    # Full: the typing event is shed from between the two messages
+    assert dispatcher.offer({"event": "MessageDeleted", "_bubble_id": 1})
+    # Nothing droppable is left, so the next never-drop event is refused
+    assert not dispatcher.offer({"event": "MessageAdded", "_bubble_id": 1})
+    release.set()
+    dispatcher.stop()
+    assert handled == ["Start", "MessageAdded", "MessageUpdated", "MessageDeleted"]
+    assert dispatcher.dropped == 1 and dispatcher.rejected == 1
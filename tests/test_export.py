@@ -0,0 +1,77 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import os
+import pytest
+from bpro import export
+from bpro.export import Exporter
+from bpro.messagestore import MessageStore
+
+@pytest.fixture
+def exporter(tmp_path):
+    store = MessageStore(str(tmp_path / "data" / "messages.db"))
+    store.upsert_messages(1, [{"id": i, "bubble_id": 1, "message": f"message {i}"} for i in range(1, 6)])
+    return Exporter(store)
+
+def test_export_coerces_ids_and_resumes(exporter, tmp_path):
+    out_dir = str(tmp_path / "out")
+    assert exporter.export(["1"], out_dir, fmt="ndjson")["messages"] == 5
+    assert exporter.export([1], out_dir, fmt="ndjson")["messages"] == 0
+    with open(os.path.join(out_dir, "1.ndjson")) as file:
+        assert len(file.readlines()) == 5
+
+def test_manifest_is_checkpointed_per_interval_not_per_batch(exporter, tmp_path, monkeypatch):
+    writes = []
+    monkeypatch.setattr(export, "atomic_write_json", lambda path, manifest: writes.append(path))
+    exporter.checkpoint_interval = 60
+    assert exporter.export([1], str(tmp_path / "out"), batch_size=1)["messages"] == 5
+    # Five batches, one checkpoint when the bubble finished
+    assert len(writes) == 1
+
+def test_interrupted_export_resumes_from_last_checkpoint(exporter, tmp_path, monkeypatch):
+    out_dir = str(tmp_path / "out")
+    write_json = export.atomic_write_json
+    writes = []
+    def crash_on_second(path, manifest):
+        writes.append(path)
+        if len(writes) == 2:
+            raise OSError("interrupted")
+        write_json(path, manifest)
+    monkeypatch.setattr(export, "atomic_write_json", crash_on_second)
+    exporter.checkpoint_interval = 0
+    # A failed bubble is reported, not raised
+    exporter.export([1], out_dir, fmt="ndjson", batch_size=2)
+    monkeypatch.setattr(export, "atomic_write_json", write_json)
+    assert exporter.export([1], out_dir, fmt="ndjson", batch_size=2)["messages"] == 3
+    with open(os.path.join(out_dir, "1.ndjson")) as file:
+        assert len(file.readlines()) == 5
+
+@pytest.mark.parametrize("bubble_ids", [["../evil"], "12", [None], [True]])
+def test_export_rejects_bad_ids_before_writing(exporter, tmp_path, bubble_ids):
+    out_dir = tmp_path / "exports" / "out"
+    with pytest.raises(ValueError):
+        exporter.export(bubble_ids, str(out_dir))
+    assert not (tmp_path / "exports").exists()
+
+def test_export_rejects_format_that_cannot_resume(exporter, tmp_path):
+    out_dir = str(tmp_path / "out")
+    exporter.export([1], out_dir, fmt="ndjson.gz")
+    with pytest.raises(ValueError):
+        exporter.check(out_dir, "ndjson")
+    with pytest.raises(ValueError):
+        exporter.check(out_dir, "csv")
+
+def test_claimed_run_refuses_a_second_export(exporter, tmp_path):
+    assert exporter.try_start()
+    assert not exporter.try_start()
+    with pytest.raises(RuntimeError):
+        exporter.export([1], str(tmp_path / "other"))
+    assert exporter.export([1], str(tmp_path / "out"), claimed=True)["messages"] == 5
+    assert exporter.try_start()
+
+def test_claimed_run_is_released_when_validation_fails(exporter, tmp_path):
+    assert exporter.try_start()
+    with pytest.raises(ValueError):
+        exporter.export(["../evil"], str(tmp_path / "out"), claimed=True)
+    assert not exporter.progress()["running"]
@@ -0,0 +1,41 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+from bpro.endpoints import ENDPOINTS, Request
+from bpro.middleware import ResponseCache
+
+def request(name, **params):
+    endpoint = ENDPOINTS[name]
+    url, payload = endpoint.build_request(params)
+    return Request(endpoint, "token", url, payload)
+
+def cached_reads(cache):
+    """Fill the cache with mutual groups for two users and info for two bubbles."""
+    calls = []
+    def send(req):
+        calls.append(req.endpoint.name)
+        return {"ok": True}
+    for req in (request("user.mutualgroups", id=7), request("user.mutualgroups", id=8),
+                request("bubble.info", bubble_id=1), request("bubble.info", bubble_id=2)):
+        cache(req, send)
+    return calls, send
+
+def test_invite_evicts_mutual_groups():
+    cache = ResponseCache()
+    calls, send = cached_reads(cache)
+    cache(request("bubble.invite", bubbleID=1, invitations=[{"user_id": 7}], sendemails=False, sendsms=False), send)
+    calls.clear()
+    for req in (request("user.mutualgroups", id=7), request("user.mutualgroups", id=8),
+                request("bubble.info", bubble_id=1), request("bubble.info", bubble_id=2)):
+        cache(req, send)
+    # Mutual groups and the invited bubble are fetched again; the other bubble is still cached
+    assert calls == ["user.mutualgroups", "user.mutualgroups", "bubble.info"]
+
+def test_membership_event_evicts_mutual_groups():
+    cache = ResponseCache()
+    calls, send = cached_reads(cache)
+    # User-scoped events still only touch that user's entries
+    assert cache.invalidate_for_event("App\\Events\\UserUpdated", data={"user_id": 7}) == 1
+    # Membership changes in bubble 2: its info and every remaining user's mutual groups
+    assert cache.invalidate_for_event("App\\Events\\MembershipCreated", "2") == 2
@@ -0,0 +1,67 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import pytest
+from bpro.endpoints import ENDPOINTS, Request
+from bpro.middleware import RetryPolicy
+
+class FakeError(Exception):
+    def __init__(self, status_code=None, retry_after=None, transient=False):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.transient = transient
+
+def failing(*errors):
+    """A call_next that raises each error in turn, then succeeds."""
+    calls = []
+    def call_next(request):
+        calls.append(request)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return {"ok": True}
+    return call_next, calls
+
+@pytest.fixture
+def user_info():
+    endpoint = ENDPOINTS["user.info"]
+    url, payload = endpoint.build_request({"id": 1})
+    return Request(endpoint, "token", url, payload)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr("bpro.middleware.time.sleep", slept.append)
+    return slept
+
+def test_transport_errors_are_retried(user_info, sleeps):
+    call_next, calls = failing(FakeError(transient=True), FakeError(503))
+    assert RetryPolicy()(user_info, call_next) == {"ok": True}
+    assert len(calls) == 3 and len(sleeps) == 2
+
+def test_other_errors_without_a_response_are_not_retried(user_info, sleeps):
+    for error in (FakeError(), ValueError("bad JSON")):
+        call_next, calls = failing(error)
+        with pytest.raises(type(error)):
+            RetryPolicy()(user_info, call_next)
+        assert len(calls) == 1
+    assert sleeps == []
+
+def test_retry_after_within_budget_is_honoured(user_info, sleeps):
+    call_next, calls = failing(FakeError(429, retry_after=3))
+    assert RetryPolicy(budget=10)(user_info, call_next) == {"ok": True}
+    assert sleeps == [3]
+
+def test_retry_after_over_budget_fails_fast(user_info, sleeps):
+    policy = RetryPolicy(budget=10)
+    call_next, calls = failing(FakeError(429, retry_after=30))
+    with pytest.raises(FakeError):
+        policy(user_info, call_next)
+    assert sleeps == [] and policy.snapshot()["gave_up"] == 1
+
+def test_budget_covers_all_attempts(user_info, sleeps):
+    call_next, calls = failing(*(FakeError(503, retry_after=4) for _ in range(3)))
+    with pytest.raises(FakeError):
+        RetryPolicy(budget=10)(user_info, call_next)
+    assert sleeps == [4, 4]
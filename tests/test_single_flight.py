@@ -0,0 +1,42 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import asyncio
+import pytest
+from bpro.endpoints import ENDPOINTS, Request
+from bpro.middleware import SingleFlight
+
+def user_info():
+    endpoint = ENDPOINTS["user.info"]
+    url, payload = endpoint.build_request({"id": 1})
+    return Request(endpoint, "token", url, payload)
+
+def test_followers_survive_a_cancelled_leader():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+        async def call_next(request):
+            calls.append(request)
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+        leader = asyncio.ensure_future(flight.acall(user_info(), call_next))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.acall(user_info(), call_next))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == {"ok": True}
+        assert len(calls) == 1 and not flight._async_flights
+    asyncio.run(scenario())
+
+def test_failure_reaches_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+        async def call_next(request):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+        results = await asyncio.gather(*(flight.acall(user_info(), call_next) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.snapshot() == {"leaders": 1, "coalesced": 2, "in_flight": 0}
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+import asyncio, importlib, time
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("aiohttp")
+pytest.importorskip("websockets")
+
+IDLE_TIMEOUT = 0.2
+
+@pytest.fixture
+def ws_client(tmp_path, monkeypatch):
+    # The app folders live under ~/.pro; keep them out of the real home directory
+    monkeypatch.setenv("HOME", str(tmp_path))
+    websocketClient = importlib.import_module("bpro.websocketClient")
+    client = websocketClient.WebSocketClient("https://example.invalid/", "token", lambda event: None, idle_timeout=IDLE_TIMEOUT, max_channels=2)
+    # No Pusher connection: subscriptions are only tracked, never sent
+    monkeypatch.setattr(client, "start", lambda: None)
+    monkeypatch.setattr(client.readjson, "get_channelcodes", lambda path, bubble_id=None: f"code{bubble_id}")
+    return client
+
+def run_sweeper(client, seconds):
+    async def sweep():
+        try:
+            await asyncio.wait_for(client._evict_idle(), seconds)
+        except asyncio.TimeoutError:
+            pass
+    asyncio.run(sweep())
+
+def test_active_bubble_stays_subscribed_past_idle_timeout(ws_client):
+    assert ws_client.connect_to_bubble(1)
+    ws_client.set_active(1)
+    assert ws_client.connect_to_bubble(2)
+    run_sweeper(ws_client, IDLE_TIMEOUT * 3)
+    assert "1" in ws_client.channels
+    assert "2" not in ws_client.channels
+    assert ws_client.evicted == 1
+
+def test_viewed_bubble_stays_subscribed_until_closed(ws_client):
+    assert ws_client.connect_to_bubble(3)
+    ws_client.set_viewing([3])
+    run_sweeper(ws_client, IDLE_TIMEOUT * 3)
+    assert "3" in ws_client.channels
+    # Once no tab has it open it gets the full idle timeout, then goes
+    ws_client.set_viewing([])
+    run_sweeper(ws_client, IDLE_TIMEOUT * 3)
+    assert "3" not in ws_client.channels
+
+def test_open_bubbles_are_never_budget_victims(ws_client):
+    assert ws_client.connect_to_bubble(1)
+    ws_client.set_active(1)
+    time.sleep(0.01)
+    assert ws_client.connect_to_bubble(2)
+    # Over budget: bubble 2 goes even though bubble 1 was viewed longer ago
+    assert ws_client.connect_to_bubble(3)
+    assert set(ws_client.channels) == {"1", "3"}
+    ws_client.set_viewing([3])
+    assert not ws_client.connect_to_bubble(4)
+
+def test_changed_channel_code_replaces_the_old_channel(ws_client, monkeypatch):
+    unsubscribed = []
+    def unsubscribe(channel):
+        unsubscribed.append(channel)
+        return asyncio.sleep(0)
+    monkeypatch.setattr(ws_client, "_unsubscribe", unsubscribe)
+    assert ws_client.connect_to_bubble(1)
+    monkeypatch.setattr(ws_client.readjson, "get_channelcodes", lambda path, bubble_id=None: f"new{bubble_id}")
+    assert ws_client.connect_to_bubble(1)
+    assert ws_client.channels == {"1": "private-bubble.1.new1"}
+    assert unsubscribed == ["private-bubble.1.code1"]
+    assert "private-bubble.1.code1" not in ws_client._channel_bubbles
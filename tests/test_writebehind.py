@@ -0,0 +1,18 @@
+#Author: Paul Estrada
+#Email: paul257@ohs.stanford.edu
+#URL: https://github.com/r0adki110/Better-Pronto
+
+from bpro.messagestore import MessageStore
+from bpro.writebehind import WriteBehindStore
+
+def test_editing_returned_messages_never_reaches_the_database(tmp_path):
+    store = WriteBehindStore(MessageStore(str(tmp_path / "messages.db")), flush_delay=60)
+    store.start()
+    message = {"id": 1, "bubble_id": 5, "created_at": "2025-01-01 15:04:00", "message": "hi"}
+    store.upsert_messages(5, [message])[0]["time_of_sending"] = "3:04 PM"
+    store.get_messages(5)[0]["time_of_sending"] = "3:04 PM"
+    store.get_replies(1)
+    store.stop()
+    row = store.store._conn().execute("SELECT created_at FROM messages WHERE message_id = 1").fetchone()
+    assert row["created_at"] == "2025-01-01 15:04:00"
+    assert [m["message_id"] for m in store.get_messages(5, since="2025-01-01 00:00:00")] == [1]